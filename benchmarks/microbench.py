@@ -0,0 +1,326 @@
+"""Microbenchmarks of the robot simulation and server startup.
+
+Every case runs for fleets of each size using synthetic programs of
+several lengths and an in-process server which is never started, so no
+network or config file is needed. Run it from the repository root::
+
+    PYTHONPATH=. python benchmarks/microbench.py
+    PYTHONPATH=. python benchmarks/microbench.py --sizes 10 100 \
+        --cases fleet_step tick
+
+With ``--baseline``, results are compared against a file saved before
+with ``--save``, which needs ``--baseline`` naming the file to store.
+Cases slower than the baseline by more than the tolerance are reported
+and make the run fail. Baselines depend on the machine, none is
+shipped::
+
+    PYTHONPATH=. python benchmarks/microbench.py --save --baseline before.json
+    PYTHONPATH=. python benchmarks/microbench.py --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+
+from asyncua import Server
+
+from dobot_server import server as s
+from dobot_server.robot_simulation import alarms, programs, robot
+from dobot_server.robot_simulation.fleet import Fleet
+
+
+SIZES = [10, 100, 1000, 10000]
+# Samples of synthetic programs, robots get them round-robin
+PROGRAM_LENGTHS = [100, 1000, 10000]
+# A case is repeated until it ran this many seconds or REPEAT times
+MIN_TIME = 0.5
+REPEAT = 5
+TOLERANCE = 0.25
+
+
+def write_program(path: str, length: int, rng: numpy.random.Generator):
+    # Random walk within motion and joint limits, effectors toggle rarely
+    coordinates = numpy.clip(
+        numpy.cumsum(rng.normal(0, 1, (length, 4)), axis=0)
+        + [150, 150, 0, 0],
+        alarms.MOTION_LIMITS[:, 0] - 5, alarms.MOTION_LIMITS[:, 1] + 5
+    )
+    joints = numpy.clip(
+        numpy.cumsum(rng.normal(0, 0.5, (length, 4)), axis=0)
+        + [0, 40, 40, 0],
+        alarms.JOINT_LIMITS[:, 0] - 5, alarms.JOINT_LIMITS[:, 1] + 5
+    )
+    effectors = rng.random((length, 3)) < 0.01
+    with open(path, "w") as f:
+        f.write("pose\tangles\tlaser_status\tsuction_cup_status\t"
+                "gripper_status\n")
+        for i in range(length):
+            f.write(
+                f"{numpy.round(coordinates[i], 2).tolist()}\t"
+                f"{numpy.round(joints[i], 2).tolist()}\t"
+                + "\t".join("TRUE" if e else "FALSE" for e in effectors[i])
+                + "\n"
+            )
+
+
+def make_configs(folder: str, size: int):
+    rng = numpy.random.default_rng(0)
+    program_configs = []
+    for program, length in enumerate(PROGRAM_LENGTHS, 1):
+        path = os.path.join(folder, f"program_{length}.txt")
+        if not os.path.exists(path):
+            write_program(path, length, rng)
+        program_configs.append(s.ProgramsConfig(
+            program=program, path=path, time_length=length // 10
+        ))
+    robot_configs = [
+        s.RobotConfig(
+            label=f"robot_{i}", serial_number=f"SN{i:08}", id=i,
+            name=f"robot {i}", program=i % len(PROGRAM_LENGTHS) + 1,
+            version="1.1.1.0", laser=bool(i % 2), suction_cup=True,
+            gripper=False, groups=[f"line_{i % 10}"],
+        )
+        for i in range(size)
+    ]
+    return program_configs, robot_configs
+
+
+def new_persona(program_configs, robot_configs):
+    server_config = s.ServerConfig(
+        server_name="benchmark", server_app_uri="benchmark",
+        server_address="127.0.0.1", server_endpoint="opc.tcp://127.0.0.1:0",
+        robots_url="http://benchmark.factory.com",
+        log_server_url="http://logserver.factory.com", security_policy=[],
+        country_name="", state_or_province_name="", locality_name="",
+        organization_name="", refresh_rate=1, capture_file=None,
+    )
+    return s.Persona(
+        s.Config(server_config, program_configs, robot_configs), seed=0
+    )
+
+
+async def new_server() -> tuple[Server, int]:
+    server = Server()
+    await server.init()
+    idx = await server.register_namespace("http://benchmark.factory.com")
+    return server, idx
+
+
+async def create_persona(folder, size):
+    program_configs, robot_configs = make_configs(folder, size)
+    persona = new_persona(program_configs, robot_configs)
+    persona.create_robots(robot_configs, program_configs)
+    return persona
+
+
+# Cases, setup returns state passed to run, only run is timed
+
+
+async def fleet_step_setup(folder, size):
+    persona = await create_persona(folder, size)
+    return {"fleet": persona.fleet, "now": time.time()}
+
+
+async def fleet_step_run(state):
+    state["now"] += 1
+    state["fleet"].step(state["now"])
+
+
+async def alarms_setup(folder, size):
+    return {"rng": numpy.random.default_rng(0), "size": size}
+
+
+async def alarms_run(state):
+    rng, size = state["rng"], state["size"]
+    joint = alarms.draw_limit_alarms(rng, size) - 1
+    motion = alarms.draw_limit_alarms(rng, size) - 1
+    step, alarm = alarms.draw_losing_step_alarms(rng, size)
+    alarms.get_alarms(joint, motion, step - 1, alarm)
+    alarms.draw_alarm_clears(rng, size)
+
+
+async def robot_init_setup(folder, size):
+    program_configs, _ = make_configs(folder, size)
+    return {"programs": program_configs, "size": size}
+
+
+async def robot_init_run(state):
+    # Programs are loaded again, as on a fresh start
+    programs._trajectories.clear()
+    fleet = Fleet(seed=0)
+    configs = state["programs"]
+    for i in range(state["size"]):
+        config = configs[i % len(configs)]
+        robot.Robot(
+            f"robot_{i}", i, "sn", "1.1.1.0", config.program, "name",
+            False, True, False, config.path, config.time_length, fleet=fleet
+        )
+
+
+async def create_robot_setup(folder, size):
+    program_configs, robot_configs = make_configs(folder, size)
+    return {"programs": program_configs, "robots": robot_configs}
+
+
+async def create_robot_run(state):
+    programs._trajectories.clear()
+    persona = new_persona(state["programs"], state["robots"])
+    persona.create_robots(state["robots"], state["programs"])
+
+
+async def add_robots_setup(folder, size):
+    persona = await create_persona(folder, size)
+    server, idx = await new_server()
+    return {"persona": persona, "server": server, "idx": idx}
+
+
+async def add_robots_run(state):
+    await state["persona"].add_robots(state["idx"], state["server"])
+
+
+async def startup_setup(folder, size):
+    program_configs, robot_configs = make_configs(folder, size)
+    server, idx = await new_server()
+    return {
+        "programs": program_configs, "robots": robot_configs,
+        "server": server, "idx": idx,
+    }
+
+
+async def startup_run(state):
+    # Robots and their nodes from scratch, as Persona.run does
+    programs._trajectories.clear()
+    persona = new_persona(state["programs"], state["robots"])
+    persona.create_robots(state["robots"], state["programs"])
+    await persona.add_robots(state["idx"], state["server"])
+
+
+async def tick_setup(folder, size):
+    persona = await create_persona(folder, size)
+    server, idx = await new_server()
+    await persona.add_robots(idx, server)
+    return {
+        "persona": persona, "server": server, "now": time.time(),
+        "slots": numpy.arange(persona.fleet.size),
+    }
+
+
+async def tick_run(state):
+    # One update of all robots as done by the scheduler
+    state["now"] += 1
+    state["persona"].fleet.step(state["now"], state["slots"])
+    await state["persona"].publisher.publish(state["server"], state["slots"])
+
+
+CASES = {
+    "fleet_step": (fleet_step_setup, fleet_step_run, False),
+    "alarms": (alarms_setup, alarms_run, False),
+    "robot_init": (robot_init_setup, robot_init_run, False),
+    "create_robot": (create_robot_setup, create_robot_run, False),
+    # Nodes can be added only once, every run needs a new server
+    "add_robots": (add_robots_setup, add_robots_run, True),
+    "startup": (startup_setup, startup_run, True),
+    "tick": (tick_setup, tick_run, False),
+}
+
+
+async def measure(case: str, folder: str, size: int) -> float:
+    """Return the fastest of repeated runs of ``case`` in seconds."""
+    setup, run, fresh = CASES[case]
+    state = await setup(folder, size)
+    times = []
+    while len(times) < REPEAT and sum(times) < MIN_TIME:
+        if fresh and times:
+            state = await setup(folder, size)
+        start = time.perf_counter()
+        await run(state)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+async def run_benchmarks(cases, sizes) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for case in cases:
+            results[case] = {}
+            for size in sizes:
+                seconds = await measure(case, folder, size)
+                results[case][str(size)] = seconds
+                print(f"{case:<14}{size:>7}{1000 * seconds:>14.3f} ms",
+                      flush=True)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for case, sizes in results.items():
+        for size, seconds in sizes.items():
+            base = baseline.get(case, {}).get(size)
+            if base is not None and seconds > base * (1 + tolerance):
+                regressions.append(
+                    f"{case} at {size} robots: {1000 * seconds:.3f} ms, "
+                    f"baseline {1000 * base:.3f} ms "
+                    f"(+{100 * (seconds / base - 1):.0f} %)"
+                )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--cases", nargs="+", choices=list(CASES), default=list(CASES)
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument(
+        "--baseline", help="results file to compare with, none by default"
+    )
+    parser.add_argument(
+        "--save", action="store_true",
+        help="store results in the --baseline file instead of comparing"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=TOLERANCE,
+        help="allowed slowdown against the baseline, 0.25 is 25 %%"
+    )
+    args = parser.parse_args()
+    if args.save and not args.baseline:
+        parser.error("--save needs the --baseline file to store results in")
+    return args
+
+
+def main():
+    args = parse_args()
+    logging.getLogger("dobot_server").setLevel(logging.WARNING)
+    logging.getLogger("asyncua").setLevel(logging.WARNING)
+    results = asyncio.run(run_benchmarks(args.cases, args.sizes))
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        for case, sizes in results.items():
+            baseline.setdefault(case, {}).update(sizes)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return
+
+    if not args.baseline:
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+import asyncio
+import gc
+import logging
+import time
+
+from asyncua import Node, Server, ua
+from asyncua.server.address_space import AttributeValue, NodeData
+
+from dobot_server.publisher import VALUES
+
+
+ROBOT_TYPE: str = "DobotArmType"
+# Robots whose nodes are added between two turns of the event loop
+BATCH_SIZE: int = 500
+
+# Node key, browse name, variant type and value of robot variables,
+# variant type of None is guessed from the value
+VARIABLES = [
+    ("id", "id", None, lambda robot: robot.id),
+    ("sn", "sn", None, lambda robot: robot.sn),
+    ("name", "name", None, lambda robot: robot.name),
+    ("version", "version", None, lambda robot: robot.version),
+    ("program", "program", None, lambda robot: robot.program),
+    ("pose", "pose", *VALUES["pose"]),
+    ("coordinates", "coordinates", *VALUES["coordinates"]),
+    ("joints", "joints", *VALUES["joints"]),
+    ("alarm", "alarm", *VALUES["alarm"]),
+    (
+        "home", "home_position", ua.VariantType.String,
+        lambda robot: robot.home
+    ),
+    ("status", "work_status", *VALUES["status"]),
+    ("laser", "laser", *VALUES["laser"]),
+    ("suction_cup", "suction_cup", *VALUES["suction_cup"]),
+    ("gripper", "gripper", *VALUES["gripper"]),
+]
+
+_logger = logging.getLogger(__name__)
+
+
+def _data_type(varianttype: ua.VariantType | None) -> ua.NodeId:
+    if varianttype is None:
+        return ua.NodeId(ua.ObjectIds.BaseDataType)
+    return ua.NodeId(varianttype.value)
+
+
+async def add_robot_type(server: Server, robots_idx: int) -> Node:
+    """Define the object type every robot is instantiated from.
+
+    Each variable of ``VARIABLES`` is a mandatory component, instances
+    have a variable of the same browse name and type definition.
+    """
+    robot_type = await server.nodes.base_object_type.add_object_type(
+        ua.NodeId(ROBOT_TYPE, robots_idx), ROBOT_TYPE
+    )
+    for _, name, varianttype, _ in VARIABLES:
+        variable = await robot_type.add_variable(
+            ua.NodeId(f"{ROBOT_TYPE}.{name}", robots_idx),
+            ua.QualifiedName(name, robots_idx),
+            None, datatype=_data_type(varianttype)
+        )
+        # Poses are scalars, coordinates and joints arrays
+        await variable.write_attribute(
+            ua.AttributeIds.ValueRank,
+            ua.DataValue(ua.Variant(ua.ValueRank.Any, ua.VariantType.Int32))
+        )
+        await variable.set_modelling_rule(True)
+    return robot_type
+
+
+def _data_value(value, varianttype: ua.VariantType,
+                is_array: bool = False) -> ua.DataValue:
+    return ua.DataValue(ua.Variant(value, varianttype, is_array=is_array))
+
+
+def _names(robots_idx: int, browse_name: str) \
+        -> dict[ua.AttributeIds, ua.DataValue]:
+    text = _data_value(
+        ua.LocalizedText(browse_name), ua.VariantType.LocalizedText
+    )
+    return {
+        ua.AttributeIds.BrowseName: _data_value(
+            ua.QualifiedName(browse_name, robots_idx),
+            ua.VariantType.QualifiedName
+        ),
+        ua.AttributeIds.Description: text,
+        ua.AttributeIds.DisplayName: text,
+    }
+
+
+def _object_attributes() -> dict[ua.AttributeIds, ua.DataValue]:
+    return {
+        ua.AttributeIds.NodeClass: _data_value(
+            ua.NodeClass.Object, ua.VariantType.Int32
+        ),
+        ua.AttributeIds.EventNotifier: _data_value(0, ua.VariantType.Byte),
+        ua.AttributeIds.WriteMask: _data_value(0, ua.VariantType.UInt32),
+        ua.AttributeIds.UserWriteMask: _data_value(0, ua.VariantType.UInt32),
+    }
+
+
+def _variable_attributes(varianttype: ua.VariantType, is_list: bool) \
+        -> dict[ua.AttributeIds, ua.DataValue]:
+    access = _data_value(
+        ua.AccessLevel.CurrentRead.mask, ua.VariantType.Byte
+    )
+    rank = ua.ValueRank.OneDimension if is_list else ua.ValueRank.Scalar
+    return {
+        ua.AttributeIds.NodeClass: _data_value(
+            ua.NodeClass.Variable, ua.VariantType.Int32
+        ),
+        ua.AttributeIds.AccessLevel: access,
+        ua.AttributeIds.UserAccessLevel: access,
+        ua.AttributeIds.ArrayDimensions: _data_value(
+            [0] if is_list else None, ua.VariantType.UInt32, is_array=True
+        ),
+        ua.AttributeIds.DataType: _data_value(
+            ua.NodeId(varianttype.value), ua.VariantType.NodeId
+        ),
+        ua.AttributeIds.Historizing: _data_value(
+            False, ua.VariantType.Boolean
+        ),
+        ua.AttributeIds.MinimumSamplingInterval: _data_value(
+            0, ua.VariantType.Double
+        ),
+        ua.AttributeIds.ValueRank: _data_value(rank, ua.VariantType.Int32),
+        ua.AttributeIds.WriteMask: _data_value(0, ua.VariantType.UInt32),
+        ua.AttributeIds.UserWriteMask: _data_value(0, ua.VariantType.UInt32),
+    }
+
+
+# References build no default node ids, all fields are given
+_NO_TYPE_DEFINITION = ua.ExpandedNodeId()
+_HAS_COMPONENT = ua.NodeId(ua.ObjectIds.HasComponent)
+_HAS_TYPE_DEFINITION = ua.NodeId(ua.ObjectIds.HasTypeDefinition)
+
+
+def _reference(reference_type: ua.NodeId, forward: bool, target: ua.NodeId,
+               target_class: ua.NodeClass, browse_name: ua.QualifiedName,
+               display_name: ua.LocalizedText,
+               type_definition: ua.NodeId = _NO_TYPE_DEFINITION) \
+        -> ua.ReferenceDescription:
+    return ua.ReferenceDescription(
+        ReferenceTypeId=reference_type,
+        IsForward=forward,
+        NodeId=target,
+        BrowseName=browse_name,
+        DisplayName=display_name,
+        NodeClass_=target_class,
+        TypeDefinition=type_definition,
+    )
+
+
+class _RobotNodes:
+    """Builds the nodes of robots as the node management service does.
+
+    Adding nodes through the service makes a data value of every
+    attribute of every node and looks up type definitions again for
+    each, which takes most of the startup of thousands of robots.
+    Attributes which are the same for every robot, as types, access
+    levels and names of type variables, are made once and shared: the
+    server replaces data values when attributes are written and never
+    changes them in place. Every node keeps its own attribute values,
+    so callbacks and writes stay per node.
+    """
+
+    def __init__(self, server: Server, robots_idx: int,
+                 robot_type: ua.NodeId):
+        self.aspace = server.iserver.aspace
+        self.robots_idx = robots_idx
+        self.robot_type = robot_type
+        self.variable_type = ua.NodeId(ua.ObjectIds.BaseDataVariableType)
+        self.objects = _object_attributes()
+        self.variables = {}
+        self.names = {}
+        self.type_references = {
+            node_id: self._type_definition(node_id)
+            for node_id in (robot_type, self.variable_type)
+        }
+
+    def _type_definition(self, node_id: ua.NodeId) \
+            -> ua.ReferenceDescription:
+        attributes = self.aspace.get(node_id).attributes
+        return _reference(
+            _HAS_TYPE_DEFINITION, True, node_id, ua.NodeClass.DataType,
+            attributes[ua.AttributeIds.BrowseName].value.Value.Value,
+            attributes[ua.AttributeIds.DisplayName].value.Value.Value,
+        )
+
+    def _add(self, node_id: ua.NodeId,
+             attributes: dict[ua.AttributeIds, ua.DataValue],
+             references: list[ua.ReferenceDescription]):
+        if node_id in self.aspace:
+            raise ua.UaError(f"Adding node {node_id} failed")
+        node = NodeData(node_id)
+        node.attributes = {
+            attribute: AttributeValue(value)
+            for attribute, value in attributes.items()
+        }
+        node.attributes[ua.AttributeIds.NodeId] = AttributeValue(
+            _data_value(node_id, ua.VariantType.NodeId)
+        )
+        node.references = references
+        self.aspace[node_id] = node
+
+    def add(self, robot, legacy_names: bool = True) -> list[ua.NodeId]:
+        """Add the object of ``robot`` and its variables.
+
+        The object is an instance of the robot type, its variables have
+        the browse names declared by the type. With ``legacy_names`` every
+        variable has an alias named ``<name>_<label>`` as the robots had
+        before the type existed, added after all variables. Returns ids of
+        the object, its variables and their aliases in this order. The
+        object has no parent, it is linked to the objects folder by
+        ``organize``.
+        """
+        object_id = ua.NodeId(robot.label, self.robots_idx)
+        object_names = _names(self.robots_idx, robot.label)
+        parent = _reference(
+            _HAS_COMPONENT, False, object_id, ua.NodeClass.Object,
+            object_names[ua.AttributeIds.BrowseName].Value.Value,
+            object_names[ua.AttributeIds.DisplayName].Value.Value,
+        )
+        variables = []
+        for _, name, varianttype, value in VARIABLES:
+            if name not in self.names:
+                self.names[name] = _names(self.robots_idx, name)
+            variant = ua.Variant(value(robot), varianttype)
+            variables.append((name, self.names[name], variant))
+        if legacy_names:
+            # Aliases are named after their robot, their names are not
+            # shared
+            variables += [
+                (f"{name}_{robot.label}",
+                 _names(self.robots_idx, f"{name}_{robot.label}"), variant)
+                for name, _, variant in variables
+            ]
+
+        ids = [object_id]
+        components = []
+        for browse_name, names, variant in variables:
+            node_id = ua.NodeId(
+                f"{robot.label}.{browse_name}", self.robots_idx
+            )
+            kind = (variant.VariantType, isinstance(variant.Value, list))
+            if kind not in self.variables:
+                self.variables[kind] = _variable_attributes(*kind)
+            self._add(
+                node_id,
+                {
+                    **self.variables[kind], **names,
+                    ua.AttributeIds.Value: ua.DataValue(variant),
+                },
+                [parent, self.type_references[self.variable_type]],
+            )
+            components.append(_reference(
+                _HAS_COMPONENT, True, node_id, ua.NodeClass.Variable,
+                names[ua.AttributeIds.BrowseName].Value.Value,
+                names[ua.AttributeIds.DisplayName].Value.Value,
+                self.variable_type,
+            ))
+            ids.append(node_id)
+        self._add(
+            object_id, {**self.objects, **object_names},
+            [self.type_references[self.robot_type], *components],
+        )
+        return ids
+
+
+def share_values(server: Server, nodes: list[ua.NodeId],
+                 aliases: list[ua.NodeId]):
+    """Make ``aliases`` show the values of ``nodes``.
+
+    Aliases get the value attribute of their node, so values written to
+    the node, its read callbacks and data change notifications are those
+    of the alias too, without writing it.
+    """
+    aspace = server.iserver.aspace
+    for node, alias in zip(nodes, aliases):
+        aspace.get(alias).attributes[ua.AttributeIds.Value] = (
+            aspace.get(node).attributes[ua.AttributeIds.Value]
+        )
+
+
+def organize(server: Server, objects: list[ua.NodeId],
+             robot_type: ua.NodeId):
+    """Reference ``objects`` of ``robot_type`` from the objects folder.
+
+    Adding a reference through the node management service looks for
+    duplicates among all references of the folder, which makes adding
+    thousands of robots quadratic. Robot labels are unique, so the
+    references are appended directly.
+    """
+    aspace = server.iserver.aspace
+    folder_id = ua.NodeId(ua.ObjectIds.ObjectsFolder)
+    folder = aspace.get(folder_id)
+    organizes = ua.NodeId(ua.ObjectIds.Organizes)
+    for node_id in objects:
+        node = aspace.get(node_id)
+        reference = ua.ReferenceDescription()
+        reference.ReferenceTypeId = organizes
+        reference.IsForward = True
+        reference.NodeId = node_id
+        reference.BrowseName = (
+            node.attributes[ua.AttributeIds.BrowseName].value.Value.Value
+        )
+        reference.DisplayName = (
+            node.attributes[ua.AttributeIds.DisplayName].value.Value.Value
+        )
+        reference.NodeClass = ua.NodeClass.Object
+        reference.TypeDefinition = robot_type
+        folder.references.append(reference)
+
+        reference = ua.ReferenceDescription()
+        reference.ReferenceTypeId = organizes
+        reference.IsForward = False
+        reference.NodeId = folder_id
+        reference.BrowseName = ua.QualifiedName("Objects", 0)
+        reference.DisplayName = ua.LocalizedText("Objects")
+        reference.NodeClass = ua.NodeClass.Object
+        node.references.append(reference)
+
+
+async def add_robots(server: Server, robots_idx: int, robot_type: ua.NodeId,
+                     robots: list, legacy_names: bool = True) \
+        -> dict[str, dict]:
+    """Add nodes of all ``robots`` in batches, returns them by label.
+
+    Nodes of a robot are keyed by ``VARIABLES`` keys, its object by
+    ``node`` and aliases of legacy names by the keys in ``aliases``.
+    """
+    start = time.perf_counter()
+    server_robots = {}
+    nodes = _RobotNodes(server, robots_idx, robot_type)
+    for i in range(0, len(robots), BATCH_SIZE):
+        batch = robots[i:i + BATCH_SIZE]
+        # Nodes of a batch are hundreds of thousands of objects which all
+        # stay, the collector would scan them again and again meanwhile
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            added = [nodes.add(robot, legacy_names) for robot in batch]
+        finally:
+            if collecting:
+                gc.enable()
+        organize(server, [ids[0] for ids in added], robot_type)
+
+        for robot, ids in zip(batch, added):
+            server_robot = {"node": server.get_node(ids[0])}
+            variables = ids[1:len(VARIABLES) + 1]
+            for (key, _, _, _), nodeid in zip(VARIABLES, variables):
+                server_robot[key] = server.get_node(nodeid)
+            if legacy_names:
+                aliases = ids[len(VARIABLES) + 1:]
+                share_values(server, variables, aliases)
+                server_robot["aliases"] = {
+                    key: server.get_node(nodeid)
+                    for (key, _, _, _), nodeid in zip(VARIABLES, aliases)
+                }
+            server_robots[robot.label] = server_robot
+        # Let the server serve clients between batches
+        await asyncio.sleep(0)
+
+    _logger.info(
+        f"Added {len(robots)} robots in "
+        f"{time.perf_counter() - start:.3f} seconds."
+    )
+    return server_robots
+
+
+async def remove_robots(server: Server, server_robots: list[dict]):
+    """Delete nodes of ``server_robots`` as returned by ``add_robots``.
+
+    Deleting nodes through the node management service with their target
+    references scans references of every node in the address space. The
+    only references to robots are those of the objects folder added by
+    ``organize``, they are removed directly instead.
+    """
+    start = time.perf_counter()
+    aspace = server.iserver.aspace
+    folder = aspace.get(ua.NodeId(ua.ObjectIds.ObjectsFolder))
+    objects = {robot["node"].nodeid for robot in server_robots}
+    folder.references[:] = [
+        reference for reference in folder.references
+        if reference.NodeId not in objects
+    ]
+    for i in range(0, len(server_robots), BATCH_SIZE):
+        # Aliases go last, deleting a node drops monitored items of both
+        items = [
+            ua.DeleteNodesItem(
+                NodeId_=node.nodeid, DeleteTargetReferences=False
+            )
+            for robot in server_robots[i:i + BATCH_SIZE]
+            for node in [
+                robot["node"],
+                *(robot[key] for key, _, _, _ in VARIABLES),
+                *robot.get("aliases", {}).values(),
+            ]
+        ]
+        results = server.iserver.node_mgt_service.delete_nodes(
+            ua.DeleteNodesParameters(NodesToDelete=items)
+        )
+        for item, result in zip(items, results):
+            if not result.is_good():
+                _logger.warning(
+                    f"Deleting node {item.NodeId} failed: {result.name}"
+                )
+        await asyncio.sleep(0)
+
+    _logger.info(
+        f"Removed {len(server_robots)} robots in "
+        f"{time.perf_counter() - start:.3f} seconds."
+    )
@@ -0,0 +1,351 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from asyncua import Server, ua
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+
+
+# Events waiting to be stored, more events are dropped and counted
+CAPTURE_QUEUE_SIZE: int = int(os.environ.get("CAPTURE_QUEUE_SIZE", 10000))
+# Seconds between writes of captured events
+CAPTURE_FLUSH_INTERVAL: float = float(
+    os.environ.get("CAPTURE_FLUSH_INTERVAL", 1.0)
+)
+# Events written at once
+CAPTURE_BATCH_SIZE: int = 1000
+# Nodes and arguments of one request kept in its event
+MAX_EVENT_ITEMS: int = 20
+
+COUNTERS = [
+    "sessions", "reads", "writes", "browses", "calls", "subscriptions",
+    "events", "dropped",
+]
+
+_logger = logging.getLogger(__name__)
+
+
+def _nodes(nodeids) -> list[str]:
+    return [nodeid.to_string() for nodeid in nodeids[:MAX_EVENT_ITEMS]]
+
+
+def _value(variant: ua.Variant) -> str:
+    return f"{variant.Value}" if variant is not None else ""
+
+
+def _certificate(data: bytes | None) -> dict:
+    if not data:
+        return {}
+    try:
+        certificate = x509.load_der_x509_certificate(data)
+    except ValueError:
+        return {"certificate": "invalid"}
+    return {
+        "certificate": certificate.fingerprint(hashes.SHA1()).hex(),
+        "certificate_subject": certificate.subject.rfc4514_string(),
+    }
+
+
+def _create_session(params, sockname=None) -> dict:
+    return {
+        "application_uri": params.ClientDescription.ApplicationUri,
+        "application_name": params.ClientDescription.ApplicationName.Text,
+        "session_name": params.SessionName,
+        "endpoint": params.EndpointUrl,
+        **_certificate(params.ClientCertificate),
+    }
+
+
+def _activate_session(params, peer_certificate=None) -> dict:
+    token = params.UserIdentityToken
+    data = {"token": type(token).__name__}
+    if isinstance(token, ua.UserNameIdentityToken):
+        data["user"] = token.UserName
+    return data
+
+
+def _read(params) -> dict:
+    return {"nodes": _nodes([item.NodeId for item in params.NodesToRead])}
+
+
+def _write(params) -> dict:
+    items = params.NodesToWrite[:MAX_EVENT_ITEMS]
+    return {
+        "nodes": _nodes([item.NodeId for item in items]),
+        "values": [_value(item.Value.Value) for item in items],
+    }
+
+
+def _browse(params) -> dict:
+    return {"nodes": _nodes([item.NodeId for item in params.NodesToBrowse])}
+
+
+def _translate(browse_paths) -> dict:
+    return {"paths": [
+        "/".join(
+            element.TargetName.to_string()
+            for element in path.RelativePath.Elements
+        )
+        for path in browse_paths[:MAX_EVENT_ITEMS]
+    ]}
+
+
+def _call(methods) -> dict:
+    methods = methods[:MAX_EVENT_ITEMS]
+    return {
+        "nodes": _nodes([method.MethodId for method in methods]),
+        "arguments": [
+            [_value(argument) for argument in method.InputArguments]
+            for method in methods
+        ],
+    }
+
+
+def _monitored_items(params) -> dict:
+    return {"nodes": _nodes([
+        item.ItemToMonitor.NodeId for item in params.ItemsToCreate
+    ])}
+
+
+def _nothing(*args, **kwargs) -> dict:
+    return {}
+
+
+# Session method: event name, counter and function describing the request
+EVENTS = {
+    "create_session": ("session_open", "sessions", _create_session),
+    "activate_session": ("session_activate", None, _activate_session),
+    "close_session": ("session_close", None, _nothing),
+    "read": ("read", "reads", _read),
+    "write": ("write", "writes", _write),
+    "browse": ("browse", "browses", _browse),
+    "translate_browsepaths_to_nodeids": ("translate", "browses", _translate),
+    "call": ("call", "calls", _call),
+    "create_subscription": ("subscription", "subscriptions", _nothing),
+    "create_monitored_items": ("monitor", "subscriptions", _monitored_items),
+}
+
+
+class JsonlStore:
+    """Appends events to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a")
+
+    def write(self, events: list[dict]):
+        self.file.writelines(
+            json.dumps(event, default=str) + "\n" for event in events
+        )
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SqliteStore:
+    """Appends events to the events table of a SQLite database."""
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS events (time TEXT, event TEXT, "
+            "client TEXT, session TEXT, data TEXT)"
+        )
+
+    def write(self, events: list[dict]):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?)",
+                [
+                    (event["time"], event["event"], event["client"],
+                     event["session"], json.dumps(event, default=str))
+                    for event in events
+                ],
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def open_store(path: str):
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteStore(path)
+    return JsonlStore(path)
+
+
+class InteractionCapture:
+    """Records what clients do with the server.
+
+    Sessions created for clients get their service methods wrapped, every
+    request puts an event with the client address, certificate, request
+    details and duration into a bounded queue and returns. A background
+    task writes queued events in batches from a single worker thread, so
+    neither requests nor robot updates wait for the disk. When the queue
+    is full, events are dropped and counted. Counters of events are
+    published in the ``interactions`` object of the log namespace.
+    """
+
+    def __init__(self, server: Server, path: str,
+                 queue_size: int = CAPTURE_QUEUE_SIZE):
+        self.server = server
+        self.path = path
+        self.queue = asyncio.Queue(queue_size)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.nodes = {}
+        self._store = None
+        self._executor = ThreadPoolExecutor(1, "capture")
+        self._task = None
+        self._watch_sessions()
+
+    def _watch_sessions(self):
+        iserver = self.server.iserver
+        create_session = iserver.create_session
+
+        def create(*args, **kwargs):
+            session = create_session(*args, **kwargs)
+            if session.external:
+                self._wrap(session)
+            return session
+
+        iserver.create_session = create
+
+    def _wrap(self, session):
+        client = session.name
+        if isinstance(client, tuple):
+            client = ":".join(f"{part}" for part in client[:2])
+        session.capture = {"client": client}
+        session.capture_closed = False
+        for name, (event, counter, describe) in EVENTS.items():
+            method = getattr(session, name)
+            if asyncio.iscoroutinefunction(method):
+                wrapper = self._async_wrapper(
+                    session, event, counter, describe, method
+                )
+            else:
+                wrapper = self._wrapper(
+                    session, event, counter, describe, method
+                )
+            setattr(session, name, wrapper)
+
+    def _wrapper(self, session, event, counter, describe, method):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = None
+            try:
+                return method(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self.record(session, event, counter, describe, args, kwargs,
+                            time.perf_counter() - start, error)
+        return wrapper
+
+    def _async_wrapper(self, session, event, counter, describe, method):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = None
+            try:
+                return await method(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self.record(session, event, counter, describe, args, kwargs,
+                            time.perf_counter() - start, error)
+        return wrapper
+
+    def record(self, session, event, counter, describe, args, kwargs,
+               duration, error):
+        if event == "session_close":
+            # Sessions are closed again when their connection is closed
+            if session.capture_closed:
+                return
+            session.capture_closed = True
+        if counter:
+            self.counters[counter] += 1
+        self.counters["events"] += 1
+        try:
+            data = describe(*args, **kwargs)
+        except Exception as e:
+            # Malformed requests are interesting too, keep what is known
+            data = {"describe_error": f"{e}"}
+        if event == "session_open":
+            # Following events of the session carry the certificate too
+            session.capture.update(
+                (key, value) for key, value in data.items()
+                if key.startswith("certificate")
+            )
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "event": event,
+            "session": session.session_id.to_string(),
+            "user": session.user.name or session.user.role.name,
+            **session.capture,
+            **data,
+            "duration": duration,
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+
+    async def start(self, log_idx: int):
+        """Open the store and publish counters under ``log_idx``."""
+        loop = asyncio.get_running_loop()
+        self._store = await loop.run_in_executor(
+            self._executor, open_store, self.path
+        )
+        interactions = await self.server.nodes.objects.add_object(
+            log_idx, "interactions"
+        )
+        for name in COUNTERS:
+            self.nodes[name] = await interactions.add_variable(
+                log_idx, name, 0, ua.VariantType.Int64
+            )
+        self._task = asyncio.create_task(self._flush_loop())
+        _logger.info(f"Capturing client interactions to {self.path}.")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._store.close
+        )
+        self._executor.shutdown()
+
+    async def flush(self):
+        loop = asyncio.get_running_loop()
+        while not self.queue.empty():
+            batch = []
+            while len(batch) < CAPTURE_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await loop.run_in_executor(
+                    self._executor, self._store.write, batch
+                )
+            except Exception as e:
+                self.counters["dropped"] += len(batch)
+                _logger.error(f"Storing {len(batch)} events failed: {e}")
+        for name, node in self.nodes.items():
+            await self.server.write_attribute_value(
+                node.nodeid,
+                ua.DataValue(ua.Variant(
+                    self.counters[name], ua.VariantType.Int64
+                )),
+            )
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(CAPTURE_FLUSH_INTERVAL)
+            await self.flush()
@@ -0,0 +1,82 @@
+import logging
+from pathlib import Path
+
+from asyncua.crypto.cert_gen import (
+    check_certificate,
+    dump_private_key_as_pem,
+    generate_private_key,
+    generate_self_signed_app_certificate,
+)
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.x509.oid import ExtendedKeyUsageOID
+
+
+# Validity of generated certificates in days
+CERTIFICATE_DAYS: int = 365
+
+_logger = logging.getLogger(__name__)
+
+
+def _load_key(key_file: Path):
+    if not key_file.is_file():
+        return None
+    try:
+        return serialization.load_pem_private_key(
+            key_file.read_bytes(), password=None
+        )
+    except (OSError, ValueError, TypeError) as e:
+        _logger.warning(f"Server key {key_file} can not be used: {e}")
+        return None
+
+
+def _load_certificate(cert_file: Path) -> x509.Certificate | None:
+    if not cert_file.is_file():
+        return None
+    try:
+        return x509.load_der_x509_certificate(cert_file.read_bytes())
+    except (OSError, ValueError) as e:
+        _logger.warning(f"Server certificate {cert_file} can not be used: {e}")
+        return None
+
+
+def _matches(cert: x509.Certificate, key, app_uri: str,
+             host_name: str) -> bool:
+    if cert.public_key().public_numbers() != key.public_key().public_numbers():
+        _logger.warning("Server certificate does not match the server key.")
+        return False
+    # check_certificate returns True when the certificate is expired, not
+    # yet valid or the app uri or host name are missing from it
+    return not check_certificate(cert, app_uri, host_name)
+
+
+def setup_certificate(key_file: Path, cert_file: Path, app_uri: str,
+                      host_name: str, subject_attrs: dict[str, str],
+                      renew: bool = False):
+    """Make sure ``key_file`` and ``cert_file`` hold a usable key and
+    a self signed certificate for ``app_uri`` and ``host_name``.
+
+    The existing key is kept and the certificate is regenerated only when
+    it is missing, expired or issued for another app uri, host name or
+    key. With ``renew`` both are always generated again. Generating the
+    key is slow and blocking, call this in an executor.
+    """
+    key = None if renew else _load_key(key_file)
+    cert = None if renew or key is None else _load_certificate(cert_file)
+    if cert is not None and _matches(cert, key, app_uri, host_name):
+        _logger.info(f"Reusing server certificate {cert_file}.")
+        return
+
+    if key is None:
+        key = generate_private_key()
+        key_file.write_bytes(dump_private_key_as_pem(key))
+    cert = generate_self_signed_app_certificate(
+        key, app_uri, subject_attrs,
+        [x509.UniformResourceIdentifier(app_uri), x509.DNSName(host_name)],
+        extended=[
+            ExtendedKeyUsageOID.CLIENT_AUTH, ExtendedKeyUsageOID.SERVER_AUTH
+        ],
+        days=CERTIFICATE_DAYS,
+    )
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.DER))
+    _logger.info(f"Generated server certificate {cert_file}.")
@@ -0,0 +1,122 @@
+import functools
+import time
+from datetime import datetime, timezone
+
+import numpy
+
+from asyncua import Server, ua
+
+from dobot_server.publisher import VALUES, get_value
+from dobot_server.robot_simulation.fleet import Fleet
+
+
+class LazyUpdates:
+    """Computes values of unobserved robots only when a client reads them.
+
+    Status nodes of every registered robot get a read callback, which
+    steps the robot first if its refresh period passed since the last
+    read. Robots are stepped and published by the scheduler only while a
+    monitored item exists on one of their nodes, so subscribers still get
+    data change notifications and robots nobody watches cost nothing.
+    """
+
+    def __init__(self, server: Server, fleet: Fleet):
+        self.fleet = fleet
+        self.aspace = server.iserver.aspace
+        self.robots = {}
+        self.nodes = {}
+        self.observers = numpy.zeros(fleet.size, dtype=numpy.int64)
+        self._period = numpy.zeros(fleet.size, dtype=numpy.float64)
+        self._updated = numpy.zeros(fleet.size, dtype=numpy.float64)
+        self._node_slots: dict[ua.NodeId, int] = {}
+        self._handles: dict[int, int] = {}
+        self._watch_monitored_items()
+
+    def _watch_monitored_items(self):
+        # Monitored items register data change callbacks on the address
+        # space, wrap those calls to count observers of each robot
+        add_datachange_callback = self.aspace.add_datachange_callback
+        delete_datachange_callback = self.aspace.delete_datachange_callback
+
+        def add(nodeid, attr, callback):
+            result, handle = add_datachange_callback(nodeid, attr, callback)
+            slot = self._node_slots.get(nodeid)
+            if slot is not None and result.is_good():
+                self._handles[handle] = slot
+                self.observers[slot] += 1
+            return result, handle
+
+        def delete(handle):
+            delete_datachange_callback(handle)
+            slot = self._handles.pop(handle, None)
+            if slot is not None:
+                self.observers[slot] -= 1
+                if not self.observers[slot]:
+                    self._set_callbacks(slot)
+
+        self.aspace.add_datachange_callback = add
+        self.aspace.delete_datachange_callback = delete
+
+    def add(self, robot, nodes: dict, period: float):
+        """Serve ``nodes`` of ``robot`` on demand, at most once a period."""
+        slot = robot.slot
+        if slot >= len(self.observers):
+            size = max(slot + 1, self.fleet.size)
+            self.observers.resize(size, refcheck=False)
+            self._period.resize(size, refcheck=False)
+            self._updated.resize(size, refcheck=False)
+        self.robots[slot] = robot
+        self.nodes[slot] = nodes
+        self._period[slot] = period
+        for node in self._value_nodes(nodes):
+            self._node_slots[node.nodeid] = slot
+        self._set_callbacks(slot)
+
+    def remove(self, robot):
+        """Forget ``robot`` before its nodes are deleted."""
+        slot = robot.slot
+        nodes = self.nodes.pop(slot)
+        del self.robots[slot]
+        for node in self._value_nodes(nodes):
+            del self._node_slots[node.nodeid]
+        self._handles = {
+            handle: handle_slot
+            for handle, handle_slot in self._handles.items()
+            if handle_slot != slot
+        }
+        self.observers[slot] = 0
+
+    @staticmethod
+    def _value_nodes(nodes: dict) -> list:
+        # Aliases share values of their nodes, monitoring them counts too
+        aliases = nodes.get("aliases", {})
+        return [nodes[name] for name in VALUES] + [
+            aliases[name] for name in VALUES if name in aliases
+        ]
+
+    def _set_callbacks(self, slot: int):
+        # Writing a node drops its callback, set them again once nobody
+        # observes the robot and the publisher stops writing it
+        for name in VALUES:
+            self.aspace.set_attribute_value_callback(
+                self.nodes[slot][name].nodeid, ua.AttributeIds.Value,
+                functools.partial(self._read, slot, name)
+            )
+
+    def _read(self, slot: int, name: str, nodeid: ua.NodeId,
+              attr: ua.AttributeIds) -> ua.DataValue:
+        robot = self.robots[slot]
+        now = time.monotonic()
+        if now - self._updated[slot] >= self._period[slot]:
+            robot.new_status()
+            self._updated[slot] = now
+        timestamp = datetime.now(timezone.utc)
+        return ua.DataValue(
+            get_value(robot, name),
+            SourceTimestamp=timestamp,
+            ServerTimestamp=timestamp,
+        )
+
+    def observed(self, slots: numpy.ndarray) -> numpy.ndarray:
+        """Return those of ``slots`` having a monitored item."""
+        return slots[self.observers[slots] > 0]
@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+LOG_FILE: str = str(os.environ.get("LOG_FILE", "server.log"))
+LOG_MAX_BYTES: int = int(os.environ.get("LOG_MAX_BYTES", 5 * 1024 * 1024))
+LOG_BACKUP_COUNT: int = int(os.environ.get("LOG_BACKUP_COUNT", 2))
+# Format of the log file, json or text, console is always text
+LOG_FORMAT: str = str(os.environ.get("LOG_FORMAT", "json"))
+LOG_CONSOLE_LEVEL: str = str(os.environ.get("LOG_CONSOLE_LEVEL", "INFO"))
+# Levels of loggers as comma separated name=LEVEL pairs
+LOG_LEVELS: str = str(os.environ.get(
+    "LOG_LEVELS", "dobot_server=DEBUG,asyncua=WARNING"
+))
+# Records waiting for the writer thread, more are dropped
+LOG_QUEUE_SIZE: int = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+# Attributes of every log record, others were passed as extra
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {
+    "message", "asctime", "taskName",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON objects including their extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler which drops records instead of blocking when the
+    writer falls behind.
+    """
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def dropped_records() -> int:
+    """Return the records dropped by queue handlers of the root logger."""
+    return sum(
+        handler.dropped for handler in logging.getLogger().handlers
+        if isinstance(handler, DroppingQueueHandler)
+    )
+
+
+class ExtraAdapter(logging.LoggerAdapter):
+    """Adds its extra fields to those passed with each record."""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+
+def parse_levels(levels: str) -> dict[str, int]:
+    result = {}
+    for item in levels.split(","):
+        name, _, level = item.strip().partition("=")
+        if level:
+            result[name] = logging.getLevelName(level.upper())
+    return result
+
+
+def setup_logging(log_file: str = LOG_FILE) -> QueueListener:
+    """Send records of all loggers through a queue to a writer thread.
+
+    The file is rotated when it reaches ``LOG_MAX_BYTES``. Records are
+    written by the writer thread, so the event loop never waits for the
+    disk. Returns the started listener, stop it to flush records on exit.
+    """
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+    )
+    file_handler.setLevel(logging.DEBUG)
+    if LOG_FORMAT == "json":
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(LOG_CONSOLE_LEVEL.upper())
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    listener = QueueListener(
+        records, file_handler, console_handler, respect_handler_level=True
+    )
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(records))
+    root.setLevel(logging.INFO)
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+    listener.start()
+    return listener
@@ -0,0 +1,296 @@
+import asyncio
+import bisect
+import logging
+import math
+import os
+import time
+
+from asyncua import Server, ua
+
+from dobot_server import logs
+
+
+# Seconds between writes of metrics to their variables
+METRICS_INTERVAL: float = float(os.environ.get("METRICS_INTERVAL", 1.0))
+# Upper bounds of histogram buckets in seconds
+BUCKETS = [
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, math.inf,
+]
+PROMETHEUS_PREFIX = "dobot_"
+
+# Name: description, histograms of seconds
+HISTOGRAMS = {
+    "tick_duration": "Duration of one scheduler tick",
+    "step_duration": "Time a tick spent simulating robots",
+    "publish_duration": "Time a tick spent writing values",
+    "robot_step_duration": "Simulation time per robot of a tick",
+    "method_duration": "Duration of method calls of clients",
+}
+# Name: description, counters only grow
+COUNTERS = {
+    "ticks": "Scheduler ticks",
+    "robot_updates": "Robots stepped by ticks",
+    "values_written": "Values written by ticks",
+    "method_calls": "Methods called by clients",
+    "missed_updates": "Robot updates which missed their deadline",
+    "log_records_dropped": "Log records dropped as the writer fell behind",
+}
+# Name: description, gauges are sampled when published
+GAUGES = {
+    "tick_lag": "Seconds the last tick started late",
+    "active_sessions": "Clients connected to the server",
+    "method_call_rate": "Method calls per second",
+    "write_rate": "Values written per second",
+}
+
+_logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Counts of observed values in buckets with fixed upper bounds."""
+
+    def __init__(self, buckets: list[float] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.last = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.last = value
+
+    def cumulative(self) -> list[int]:
+        result, total = [], 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def quantile(self, q: float) -> float:
+        """Return the upper bound of the bucket holding quantile ``q``."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, total in zip(self.buckets, self.cumulative()):
+            if total >= rank:
+                return bound if bound != math.inf else self.buckets[-2]
+        return self.buckets[-2]
+
+
+class Metrics:
+    """Timings and counters of the tick loop and of client requests.
+
+    Recording only updates numbers in memory, so it costs nothing worth
+    measuring per tick. A background task samples the gauges and writes
+    everything to the ``simulation`` object of the log namespace once per
+    ``METRICS_INTERVAL``. Histograms are published as the last value,
+    count, sum, 99th percentile and cumulative bucket counts. The same
+    metrics can be served in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.histograms = {name: Histogram() for name in HISTOGRAMS}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.gauges = dict.fromkeys(GAUGES, 0.0)
+        self.server = None
+        self.scheduler = None
+        self.nodes = {}
+        self._task = None
+        self._previous = (time.monotonic(), 0, 0)
+
+    def observe(self, name: str, value: float):
+        self.histograms[name].observe(value)
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def observe_tick(self, robots: int, written: int, started: float,
+                     stepped: float, published: float):
+        """Record a tick of ``robots`` given its perf_counter times."""
+        self.counters["ticks"] += 1
+        self.counters["robot_updates"] += robots
+        self.counters["values_written"] += written
+        self.histograms["tick_duration"].observe(published - started)
+        self.histograms["step_duration"].observe(stepped - started)
+        self.histograms["publish_duration"].observe(published - stepped)
+        if robots:
+            self.histograms["robot_step_duration"].observe(
+                (stepped - started) / robots
+            )
+
+    def _watch_methods(self, server: Server):
+        method_service = server.iserver.method_service
+        call = method_service.call
+
+        async def wrapper(methods):
+            start = time.perf_counter()
+            try:
+                return await call(methods)
+            finally:
+                self.counters["method_calls"] += len(methods)
+                self.histograms["method_duration"].observe(
+                    time.perf_counter() - start
+                )
+
+        method_service.call = wrapper
+
+    def sample(self):
+        """Update gauges and counters taken from the scheduler and the
+        logging pipeline.
+        """
+        now = time.monotonic()
+        if self.scheduler is not None:
+            self.gauges["tick_lag"] = self.scheduler.lag
+            self.counters["missed_updates"] = self.scheduler.missed
+        self.counters["log_records_dropped"] = logs.dropped_records()
+        if self.server is not None and self.server.bserver is not None:
+            self.gauges["active_sessions"] = len(self.server.bserver.clients)
+        previous, calls, written = self._previous
+        elapsed = now - previous
+        if elapsed > 0:
+            self.gauges["method_call_rate"] = (
+                (self.counters["method_calls"] - calls) / elapsed
+            )
+            self.gauges["write_rate"] = (
+                (self.counters["values_written"] - written) / elapsed
+            )
+        self._previous = (
+            now, self.counters["method_calls"],
+            self.counters["values_written"],
+        )
+
+    async def start(self, server: Server, log_idx: int, scheduler=None):
+        """Publish metrics under ``log_idx`` and count method calls."""
+        self.server = server
+        self.scheduler = scheduler
+        self._watch_methods(server)
+        simulation = await server.nodes.objects.add_object(
+            log_idx, "simulation"
+        )
+        for name in GAUGES:
+            await self._add(simulation, log_idx, name, 0.0,
+                            ua.VariantType.Double)
+        for name in COUNTERS:
+            await self._add(simulation, log_idx, name, 0,
+                            ua.VariantType.Int64)
+        for name in HISTOGRAMS:
+            for suffix, value, varianttype in [
+                ("", 0.0, ua.VariantType.Double),
+                ("_count", 0, ua.VariantType.Int64),
+                ("_sum", 0.0, ua.VariantType.Double),
+                ("_p99", 0.0, ua.VariantType.Double),
+                ("_buckets", [0] * len(BUCKETS), ua.VariantType.Int64),
+            ]:
+                await self._add(simulation, log_idx, f"{name}{suffix}",
+                                value, varianttype)
+        self._task = asyncio.create_task(self._publish_loop())
+
+    async def _add(self, parent, log_idx, name, value, varianttype):
+        node = await parent.add_variable(log_idx, name, value, varianttype)
+        self.nodes[name] = (node.nodeid, varianttype)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def values(self) -> dict:
+        """Return values of all published variables by name."""
+        values = {**self.gauges, **self.counters}
+        for name, histogram in self.histograms.items():
+            values[name] = histogram.last
+            values[f"{name}_count"] = histogram.count
+            values[f"{name}_sum"] = histogram.sum
+            values[f"{name}_p99"] = histogram.quantile(0.99)
+            values[f"{name}_buckets"] = histogram.cumulative()
+        return values
+
+    async def publish(self):
+        self.sample()
+        for name, value in self.values().items():
+            nodeid, varianttype = self.nodes[name]
+            await self.server.write_attribute_value(
+                nodeid, ua.DataValue(ua.Variant(value, varianttype))
+            )
+
+    async def _publish_loop(self):
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL)
+            try:
+                await self.publish()
+            except Exception as e:
+                _logger.error(f"Publishing metrics failed: {e}")
+
+    def prometheus(self) -> str:
+        """Return all metrics in the Prometheus text exposition format.
+
+        Gauges are as sampled by the last publish, so scrapes do not
+        change the rates seen by clients.
+        """
+        lines = []
+        for name, description in GAUGES.items():
+            metric = f"{PROMETHEUS_PREFIX}{name}"
+            lines += [
+                f"# HELP {metric} {description}",
+                f"# TYPE {metric} gauge",
+                f"{metric} {self.gauges[name]}",
+            ]
+        for name, description in COUNTERS.items():
+            metric = f"{PROMETHEUS_PREFIX}{name}_total"
+            lines += [
+                f"# HELP {metric} {description}",
+                f"# TYPE {metric} counter",
+                f"{metric} {self.counters[name]}",
+            ]
+        for name, description in HISTOGRAMS.items():
+            metric = f"{PROMETHEUS_PREFIX}{name}_seconds"
+            histogram = self.histograms[name]
+            lines += [
+                f"# HELP {metric} {description}",
+                f"# TYPE {metric} histogram",
+            ]
+            for bound, total in zip(histogram.buckets,
+                                    histogram.cumulative()):
+                le = "+Inf" if bound == math.inf else f"{bound}"
+                lines.append(f'{metric}_bucket{{le="{le}"}} {total}')
+            lines += [
+                f"{metric}_sum {histogram.sum}",
+                f"{metric}_count {histogram.count}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            # Headers are not needed, read them so the client is not reset
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" \
+                    and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.prometheus()
+            else:
+                status, body = "404 Not Found", "Not found\n"
+            data = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + data
+            )
+            await writer.drain()
+        except (OSError, asyncio.TimeoutError, UnicodeError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, address: str, port: int) -> asyncio.Server:
+        """Serve ``/metrics`` over HTTP, return the started server."""
+        http_server = await asyncio.start_server(self._handle, address, port)
+        _logger.info(f"Serving metrics on http://{address}:{port}/metrics.")
+        return http_server
@@ -0,0 +1,89 @@
+import asyncio
+import cProfile
+import logging
+import os
+import signal
+import time
+
+
+# Seconds profiled after a trigger
+PROFILE_SECONDS: float = float(os.environ.get("PROFILE_SECONDS", 30))
+# Folder where profiles are written
+PROFILE_DIR: str = str(os.environ.get("PROFILE_DIR", "profiles"))
+# Profile the first PROFILE_SECONDS after start
+PROFILE_ON_START: bool = str(
+    os.environ.get("PROFILE_ON_START", False)
+).lower() in ("true", "1")
+PROFILE_SIGNAL = getattr(signal, "SIGUSR1", None)
+
+_logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Profiles the event loop thread for a fixed window on request.
+
+    A trigger, ``SIGUSR1`` or ``PROFILE_ON_START``, enables ``cProfile``
+    for ``seconds`` and then writes the stats in the pstats format into
+    ``folder``, readable by ``python -m pstats`` or snakeviz. Triggers
+    while profiling are ignored. Nothing is profiled until triggered, so
+    the hook costs nothing when unused.
+    """
+
+    def __init__(self, seconds: float = PROFILE_SECONDS,
+                 folder: str = PROFILE_DIR):
+        self.seconds = seconds
+        self.folder = folder
+        self._profile = None
+        self._loop = None
+        self._timer = None
+
+    def install(self):
+        """Start profiling on ``SIGUSR1`` where signals are supported."""
+        self._loop = asyncio.get_running_loop()
+        if PROFILE_SIGNAL is None:
+            return
+        try:
+            self._loop.add_signal_handler(PROFILE_SIGNAL, self.start)
+        except (NotImplementedError, RuntimeError) as e:
+            _logger.warning(f"Profiling on signal is not available: {e}")
+            return
+        _logger.info(
+            f"Send SIGUSR1 to process {os.getpid()} to profile "
+            f"{self.seconds} seconds."
+        )
+
+    def uninstall(self):
+        if self._loop and PROFILE_SIGNAL is not None:
+            self._loop.remove_signal_handler(PROFILE_SIGNAL)
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def start(self):
+        if self.running:
+            _logger.info("Profiling is already running.")
+            return
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        self._timer = self._loop.call_later(self.seconds, self.stop)
+        _logger.info(f"Profiling for {self.seconds} seconds.")
+
+    def stop(self):
+        profile, self._profile = self._profile, None
+        if profile is None:
+            return
+        self._timer.cancel()
+        profile.disable()
+        path = os.path.join(
+            self.folder,
+            f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.pstats",
+        )
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            profile.dump_stats(path)
+        except OSError as e:
+            _logger.error(f"Writing profile failed: {e}")
+            return
+        _logger.info(f"Profile written to {path}.")
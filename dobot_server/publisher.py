@@ -0,0 +1,132 @@
+import logging
+from datetime import datetime, timezone
+
+import numpy
+
+from asyncua import Server, ua
+
+from dobot_server.robot_simulation.fleet import Fleet
+
+
+_logger = logging.getLogger(__name__)
+
+# Variant type and value of every robot node changing with robot status
+VALUES = {
+    "pose": (ua.VariantType.String, lambda robot: robot.pose),
+    "coordinates": (
+        ua.VariantType.Double, lambda robot: robot.coordinates.tolist()
+    ),
+    "joints": (ua.VariantType.Double, lambda robot: robot.joints.tolist()),
+    "alarm": (ua.VariantType.Int64, lambda robot: robot.alarm),
+    "status": (ua.VariantType.Boolean, lambda robot: robot.work_status),
+    "laser": (ua.VariantType.String, lambda robot: f"{robot.laser}"),
+    "suction_cup": (
+        ua.VariantType.String, lambda robot: f"{robot.suction_cup}"
+    ),
+    "gripper": (ua.VariantType.String, lambda robot: f"{robot.gripper}"),
+}
+
+# Fleet columns compared against the values last written to the nodes
+COLUMNS = {
+    "position": ("pose", "coordinates", "joints"),
+    "alarm": ("alarm",),
+    "work_status": ("status",),
+    "laser_status": ("laser",),
+    "suction_cup_status": ("suction_cup",),
+    "gripper_status": ("gripper",),
+}
+
+
+def _grow(array: numpy.ndarray, size: int) -> numpy.ndarray:
+    if len(array) >= size:
+        return array
+    grown = numpy.zeros(size, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def get_value(robot, name: str) -> ua.Variant:
+    varianttype, value = VALUES[name]
+    return ua.Variant(value(robot), varianttype)
+
+
+class Publisher:
+    """Writes changed robot values to their OPC UA nodes.
+
+    The values last written are kept for every registered robot. On
+    ``publish`` they are compared with the fleet arrays and only nodes of
+    robots whose pose, alarm, work status or effector changed are written,
+    all of them in a single write request.
+    """
+
+    def __init__(self, fleet: Fleet):
+        self.fleet = fleet
+        self.robots = {}
+        self.nodes = {}
+        self._registered = numpy.zeros(0, dtype=bool)
+        self._published = {
+            column: numpy.zeros(0, dtype=getattr(fleet, column).dtype)
+            for column in COLUMNS
+        }
+
+    def add(self, robot, nodes: dict):
+        """Register ``robot`` whose ``nodes`` hold its current values."""
+        self.robots[robot.slot] = robot
+        self.nodes[robot.slot] = nodes
+        self._registered = _grow(self._registered, robot.slot + 1)
+        self._registered[robot.slot] = True
+        for column, published in self._published.items():
+            published = _grow(published, robot.slot + 1)
+            published[robot.slot] = getattr(self.fleet, column)[robot.slot]
+            self._published[column] = published
+
+    def remove(self, robot):
+        self._registered[robot.slot] = False
+        del self.robots[robot.slot]
+        del self.nodes[robot.slot]
+
+    def _changes(self, column: str, slots: numpy.ndarray) -> numpy.ndarray:
+        current = getattr(self.fleet, column)[slots]
+        published = self._published[column]
+        changed = current != published[slots]
+        published[slots[changed]] = current[changed]
+        return slots[changed]
+
+    def changes(self, slots=None) -> list[ua.WriteValue]:
+        if slots is None:
+            slots = numpy.flatnonzero(self._registered)
+        else:
+            slots = slots[self._registered[slots]]
+        values = []
+        # Values of one publish share the time they were taken at
+        timestamp = datetime.now(timezone.utc)
+        for column, names in COLUMNS.items():
+            for slot in self._changes(column, slots):
+                robot, nodes = self.robots[slot], self.nodes[slot]
+                for name in names:
+                    values.append(ua.WriteValue(
+                        NodeId_=nodes[name].nodeid,
+                        AttributeId=ua.AttributeIds.Value,
+                        Value=ua.DataValue(
+                            get_value(robot, name),
+                            SourceTimestamp=timestamp,
+                            ServerTimestamp=timestamp,
+                        ),
+                    ))
+        return values
+
+    async def publish(self, server: Server, slots=None) -> int:
+        """Write changed values of robots in ``slots`` (all by default)
+        in one request, returns their count.
+        """
+        values = self.changes(slots)
+        if not values:
+            return 0
+        params = ua.WriteParameters(NodesToWrite=values)
+        results = await server.iserver.isession.write(params)
+        for value, result in zip(values, results):
+            if not result.is_good():
+                _logger.warning(
+                    f"Writing {value.NodeId} failed: {result.name}"
+                )
+        return len(values)
@@ -0,0 +1,95 @@
+import fnmatch
+import re
+
+
+# Selectors given to control methods are separated by commas or spaces
+SEPARATORS = re.compile(r"[,\s]+")
+WILDCARDS = re.compile(r"[*?\[]")
+
+
+class RobotRegistry:
+    """Robots of the server indexed by label, id, program and group.
+
+    Control methods address robots by selectors:
+    - ``robot_1`` robot with the label,
+    - ``robot_*`` robots whose label matches the wildcard pattern,
+    - ``id:1`` robots with the id,
+    - ``program:1`` robots running the program,
+    - ``group:line_1`` robots of the group,
+    - ``*`` all robots.
+    """
+
+    def __init__(self):
+        self.robots = []
+        self.labels = {}
+        self.ids: dict[str, list] = {}
+        self.programs: dict[str, list] = {}
+        self.groups: dict[str, list] = {}
+        self._selectors = {
+            "id": self.ids,
+            "program": self.programs,
+            "group": self.groups,
+        }
+
+    def __len__(self) -> int:
+        return len(self.robots)
+
+    def __iter__(self):
+        return iter(self.robots)
+
+    def add(self, robot, groups=()):
+        if robot.label in self.labels:
+            raise ValueError(f"Robot label {robot.label} is not unique")
+        self.robots.append(robot)
+        self.labels[robot.label] = robot
+        self.ids.setdefault(str(robot.id), []).append(robot)
+        self.programs.setdefault(str(robot.program), []).append(robot)
+        for group in groups:
+            self.groups.setdefault(str(group), []).append(robot)
+
+    def remove(self, labels) -> list:
+        """Remove robots with ``labels``, returns them."""
+        removed = [self.labels.pop(label) for label in labels]
+        if not removed:
+            return removed
+        gone = set(map(id, removed))
+        self.robots = [
+            robot for robot in self.robots if id(robot) not in gone
+        ]
+        for index in self._selectors.values():
+            for key in list(index):
+                index[key] = [
+                    robot for robot in index[key] if id(robot) not in gone
+                ]
+                if not index[key]:
+                    del index[key]
+        return removed
+
+    def get(self, label: str):
+        return self.labels.get(label)
+
+    def _match(self, selector: str) -> list:
+        if selector == "*":
+            return self.robots
+        kind, _, key = selector.partition(":")
+        if key and kind in self._selectors:
+            return self._selectors[kind].get(key, [])
+        if WILDCARDS.search(selector):
+            return [
+                self.labels[label]
+                for label in fnmatch.filter(self.labels, selector)
+            ]
+        robot = self.labels.get(selector)
+        return [robot] if robot else []
+
+    def select(self, selectors: str) -> list:
+        """Return robots matching any of comma or space separated
+        ``selectors``, each robot once and in the order of selectors.
+        """
+        selected = {}
+        for selector in SEPARATORS.split(selectors.strip()):
+            if not selector:
+                continue
+            for robot in self._match(selector):
+                selected.setdefault(robot.label, robot)
+        return list(selected.values())
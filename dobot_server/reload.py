@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+from typing import Callable
+
+import yaml
+
+from asyncua import ua
+
+from dobot_server.robot_simulation import programs
+
+
+# Seconds between checks of the config file, 0 disables reloading
+CONFIG_POLL_INTERVAL: float = float(
+    os.environ.get("CONFIG_POLL_INTERVAL", 2.0)
+)
+
+_logger = logging.getLogger(__name__)
+
+
+class ConfigWatcher:
+    """Applies changes of the config file to running servers.
+
+    The file is checked every ``CONFIG_POLL_INTERVAL`` seconds. When its
+    modification time or size changed, it is loaded by ``load`` and each
+    persona gets the config with its endpoint through ``reconfigure``.
+    Servers added, removed or moved to another endpoint need a restart.
+    A file which cannot be loaded or applied is reported and the servers
+    keep running as they are.
+    """
+
+    def __init__(self, path: str, load: Callable[[str], list], personas):
+        self.path = path
+        self.load = load
+        self.personas = personas
+        self.stamp = self._stamp()
+
+    def _stamp(self) -> tuple | None:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def check(self) -> bool:
+        """Apply the config file if it changed, returns whether it did."""
+        stamp = self._stamp()
+        if stamp is None or stamp == self.stamp:
+            return False
+        self.stamp = stamp
+        try:
+            configs = await asyncio.get_running_loop().run_in_executor(
+                None, self.load, self.path
+            )
+        except (OSError, yaml.YAMLError, KeyError, TypeError,
+                ValueError) as e:
+            _logger.error(f"Loading changed config failed: {e}")
+            return False
+
+        by_endpoint = {
+            config.server.server_endpoint: config for config in configs
+        }
+        running = {
+            persona.config.server.server_endpoint for persona in self.personas
+        }
+        if set(by_endpoint) != running:
+            _logger.warning(
+                "Servers were added, removed or moved, restart to apply."
+            )
+        for persona in self.personas:
+            config = by_endpoint.get(persona.config.server.server_endpoint)
+            if config is None:
+                continue
+            try:
+                await persona.reconfigure(config)
+            except (OSError, ValueError, ua.UaError) as e:
+                persona.log.error(f"Applying changed config failed: {e}")
+        programs.release({
+            os.path.abspath(path)
+            for persona in self.personas
+            for path in persona.config.program_paths()
+        })
+        return True
+
+    async def run(self):
+        for persona in self.personas:
+            await persona.ready.wait()
+        self.stamp = self._stamp()
+        _logger.info(f"Watching {self.path} for changes.")
+        while True:
+            await asyncio.sleep(CONFIG_POLL_INTERVAL)
+            await self.check()
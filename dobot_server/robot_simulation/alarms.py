@@ -0,0 +1,76 @@
+import os
+
+import numpy
+
+
+PROBABILITY_RANGE: int = int(os.environ.get("PROBABILITY_RANGE", 10000))
+ALARM_CLEARED: int = int(os.environ.get("ALARM_CLEARED", 900))
+ALARMS_RANGE: int = int(os.environ.get("ALARMS_RANGE", 20))
+ALARM_SEED = os.environ.get("ALARM_SEED")
+ALARM_SEED = int(ALARM_SEED) if ALARM_SEED else None
+
+INVERSE_RESOLVE_ALARM = 0x12
+MOTION_INVERSE_RESOLVE_ALARM = 0x21
+LOSING_STEP_ALARMS = numpy.array([0x50, 0x51, 0x52, 0x53])
+
+# Movement limits:
+# coordinates[0]: [-50, 350], coordinates[1]: [-50, 350],
+# coordinates[2]: [-200, 200], coordinates[-130, 130]
+MOTION_LIMITS = numpy.array(
+    [[-47, 347], [-47, 347], [-197, 197], [-128, 128]]
+)
+
+# Joint limits:
+# joints[0]: [-90, 90], joints[1]: [0, 85],
+# joints[2]: [-10, 90], joints[-90, 90]
+JOINT_LIMITS = numpy.array([[-88, 88], [3, 82], [-3, 88], [-88, 88]])
+
+# A robot status update out of limits fires an alarm with this probability
+LIMIT_PROBABILITY = 1 / PROBABILITY_RANGE
+# Every status update draws each losing step alarm with this probability,
+# the first alarm drawn wins
+_step_draw = 1 / (100*PROBABILITY_RANGE)
+_step_weights = _step_draw * (1 - _step_draw) ** numpy.arange(4)
+LOSING_STEP_PROBABILITY = _step_weights.sum()
+LOSING_STEP_WEIGHTS = _step_weights / LOSING_STEP_PROBABILITY
+# Status update after ALARM_CLEARED seconds clears alarm with probability
+CLEAR_PROBABILITY = 1 / ALARMS_RANGE
+
+
+def limits_exceeded(values: numpy.ndarray,
+                    limits: numpy.ndarray) -> numpy.ndarray:
+    return ((values < limits[:, 0]) | (values > limits[:, 1])).any(axis=-1)
+
+
+def draw_limit_alarms(rng: numpy.random.Generator,
+                      count: int) -> numpy.ndarray:
+    """Number of out of limits status updates until an alarm fires."""
+    return rng.geometric(LIMIT_PROBABILITY, size=count)
+
+
+def draw_losing_step_alarms(
+        rng: numpy.random.Generator, count: int
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Number of status updates until a losing step alarm and its code."""
+    countdown = rng.geometric(LOSING_STEP_PROBABILITY, size=count)
+    alarm = rng.choice(LOSING_STEP_ALARMS, size=count, p=LOSING_STEP_WEIGHTS)
+    return countdown, alarm
+
+
+def draw_alarm_clears(rng: numpy.random.Generator,
+                      count: int) -> numpy.ndarray:
+    """Number of status updates after ALARM_CLEARED until alarm clears."""
+    return rng.geometric(CLEAR_PROBABILITY, size=count)
+
+
+def get_alarms(joint_alarm_in: numpy.ndarray,
+               motion_alarm_in: numpy.ndarray,
+               step_alarm_in: numpy.ndarray,
+               step_alarm: numpy.ndarray) -> numpy.ndarray:
+    return numpy.where(
+        joint_alarm_in <= 0, INVERSE_RESOLVE_ALARM,
+        numpy.where(
+            motion_alarm_in <= 0, MOTION_INVERSE_RESOLVE_ALARM,
+            numpy.where(step_alarm_in <= 0, step_alarm, 0x00)
+        )
+    )
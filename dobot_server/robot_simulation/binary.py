@@ -0,0 +1,141 @@
+import os
+import struct
+
+import numpy
+
+
+MAGIC = b"DOBOTTRJ"
+VERSION = 3
+# Magic, version, header size, columns, effector flags, samples, sample
+# period in seconds and checksum of the alarm limits the flags column was
+# computed with, followed by comma separated column names
+_HEADER = struct.Struct("<8sHHHHQdI")
+# Headers are padded to a multiple of this, so records stay aligned
+_ALIGNMENT = 64
+COORDINATES = ("x", "y", "z", "r")
+JOINTS = ("j1", "j2", "j3", "j4")
+COLUMNS = COORDINATES + JOINTS
+# Effectors by their bit in the flags column and in the header
+EFFECTORS = ("laser", "suction_cup", "gripper")
+EXTENSION = ".trj"
+
+
+def is_binary(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write(path: str, coordinates: numpy.ndarray, joints: numpy.ndarray,
+          flags: numpy.ndarray, limits: int = 0, period: float = 0.0):
+    """Write samples as float32 records of ``COLUMNS``.
+
+    Records are followed by one byte of ``flags`` per sample, bits of
+    effectors on and alarm limits exceeded. ``limits`` is the checksum of
+    the alarm limits the flags were computed with. The header flags the
+    effectors on in any sample. ``period`` is the time between samples of
+    the recording, 0 when unknown.
+    """
+    records = numpy.empty((len(coordinates), len(COLUMNS)), numpy.float32)
+    records[:, 0:4] = coordinates
+    records[:, 4:8] = joints
+    flags = numpy.asarray(flags, dtype=numpy.uint8)
+    effectors = int(numpy.bitwise_or.reduce(flags, initial=0))
+    effectors &= (1 << len(EFFECTORS)) - 1
+    names = ",".join(COLUMNS).encode("ascii")
+    size = _HEADER.size + len(names)
+    size += -size % _ALIGNMENT
+    header = _HEADER.pack(
+        MAGIC, VERSION, size, len(COLUMNS), effectors, len(records),
+        period, limits
+    ) + names
+    with open(path, "wb") as f:
+        f.write(header.ljust(size, b"\0"))
+        f.write(records.tobytes())
+        f.write(flags.tobytes())
+
+
+def read_header(path: str) -> dict:
+    """Return the header of a binary trajectory file.
+
+    Raises ValueError for files which are not binary trajectories or whose
+    size does not match the header.
+    """
+    with open(path, "rb") as f:
+        fixed = f.read(_HEADER.size)
+        if len(fixed) < _HEADER.size:
+            raise ValueError(f"{path} is not a binary trajectory")
+        magic, version, size, columns, effectors, samples, period, \
+            limits = _HEADER.unpack(fixed)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary trajectory")
+        if version != VERSION:
+            raise ValueError(
+                f"{path} has unsupported trajectory version {version}, "
+                f"convert its text program again"
+            )
+        names = f.read(size - _HEADER.size).rstrip(b"\0")
+    names = names.decode("ascii").split(",")
+    if len(names) != columns:
+        raise ValueError(
+            f"{path} has {columns} columns but {len(names)} names"
+        )
+    if os.path.getsize(path) != size + (4 * columns + 1) * samples:
+        raise ValueError(f"{path} is truncated")
+    return {
+        "size": size,
+        "columns": names,
+        "effectors": {
+            name: bool(effectors & (1 << bit))
+            for bit, name in enumerate(EFFECTORS)
+        },
+        "samples": samples,
+        "period": period,
+        "limits": limits,
+    }
+
+
+def map_columns(path: str, header: dict | None = None) \
+        -> dict[str, numpy.ndarray]:
+    """Map the records and flags of a binary trajectory file into memory.
+
+    Coordinates, joints and flags are read-only views of the mapped file,
+    so loading costs no parsing nor scanning of samples and processes
+    mapping the same file share its pages. Pass ``header`` when it was
+    read already.
+    """
+    if header is None:
+        header = read_header(path)
+    names = header["columns"]
+    missing = [name for name in COLUMNS if name not in names]
+    if missing:
+        raise ValueError(f"{path} has no columns {missing}")
+    samples = header["samples"]
+    if not samples:
+        records = numpy.zeros((0, len(names)), numpy.float32)
+        flags = numpy.zeros(0, numpy.uint8)
+    else:
+        records = numpy.memmap(
+            path, dtype=numpy.float32, mode="r", offset=header["size"],
+            shape=(samples, len(names)),
+        )
+        flags = numpy.memmap(
+            path, dtype=numpy.uint8, mode="r",
+            offset=header["size"] + records.nbytes, shape=(samples,),
+        )
+
+    def select(columns: tuple) -> numpy.ndarray:
+        indexes = [names.index(name) for name in columns]
+        start = indexes[0]
+        if indexes == list(range(start, start + len(indexes))):
+            values = records[:, start:start + len(indexes)]
+        else:
+            values = records[:, indexes]
+        values.setflags(write=False)
+        return values
+
+    flags.setflags(write=False)
+    return {
+        "coordinates": select(COORDINATES),
+        "joints": select(JOINTS),
+        "flags": flags,
+    }
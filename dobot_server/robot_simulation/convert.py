@@ -0,0 +1,71 @@
+"""Convert text program files into binary trajectory files.
+
+Usage: python -m dobot_server.robot_simulation.convert programs/*.txt
+"""
+import argparse
+import os
+import time
+
+from dobot_server.robot_simulation import binary, programs
+
+
+def convert(source: str, target: str | None = None,
+            period: float = 0.0) -> str:
+    """Write program file ``source`` as binary trajectory ``target``.
+
+    ``target`` defaults to ``source`` with the ``.trj`` extension.
+    ``period`` is the time between samples of the recording. Returns the
+    path written.
+    """
+    if target is None:
+        target = os.path.splitext(source)[0] + binary.EXTENSION
+    trajectory = programs.read_trajectory(source)
+    binary.write(
+        target,
+        trajectory.coordinates,
+        trajectory.joints,
+        trajectory.flags,
+        programs.LIMITS_CHECKSUM,
+        period,
+    )
+    return target
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="text program files")
+    parser.add_argument(
+        "-o", "--output",
+        help="output file, only with one input file, by default the input "
+             "file with the .trj extension"
+    )
+    parser.add_argument(
+        "--period", type=float, default=0.0,
+        help="seconds between samples of the recording, 0 when unknown"
+    )
+    args = parser.parse_args()
+    if args.output and len(args.files) > 1:
+        parser.error("--output needs exactly one input file")
+    return args
+
+
+def main():
+    args = parse_args()
+    for source in args.files:
+        start = time.perf_counter()
+        target = convert(source, args.output, args.period)
+        header = binary.read_header(target)
+        effectors = [
+            name for name, used in header["effectors"].items() if used
+        ]
+        print(
+            f"{source} -> {target}: {header['samples']} samples, "
+            f"period {header['period']} s, "
+            f"effectors {', '.join(effectors) or 'none'}, "
+            f"{os.path.getsize(target)} bytes, "
+            f"{time.perf_counter() - start:.3f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
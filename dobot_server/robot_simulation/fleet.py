@@ -0,0 +1,258 @@
+import numpy
+
+from dobot_server.robot_simulation import alarms, programs
+from dobot_server.utils import EFFECTOR_STATUS
+
+
+# Per robot state, one array of this type for each name
+COLUMNS: dict[str, type] = {
+    "timer": numpy.float64,
+    "runtime": numpy.float64,
+    "program_runtime": numpy.float64,
+    "speed": numpy.float64,
+    "length": numpy.int64,
+    "offset": numpy.int64,
+    "position": numpy.int64,
+    "work_status": bool,
+    "alarm": numpy.int64,
+    "alarm_timer": numpy.float64,
+    "joint_alarm_in": numpy.int64,
+    "motion_alarm_in": numpy.int64,
+    "step_alarm_in": numpy.int64,
+    "step_alarm": numpy.int64,
+    "clear_alarm_in": numpy.int64,
+    "laser": bool,
+    "suction_cup": bool,
+    "gripper": bool,
+    "laser_status": bool,
+    "suction_cup_status": bool,
+    "gripper_status": bool,
+}
+
+
+class Fleet:
+    """Simulation state of all robots stored column-wise.
+
+    Every robot owns one slot in the arrays listed in ``COLUMNS``. Flags
+    of samples of the trajectories robots run are concatenated into
+    ``flags`` and a robot addresses its program through ``offset`` and
+    ``length``, so ``step`` advances any subset of robots with a few array
+    operations. Flags of trajectories no robot runs any more are dropped.
+    Coordinates and joints stay in the trajectories, robots read them
+    only when their values are published.
+
+    Alarms are scheduled ahead as countdowns of status updates drawn from
+    ``rng``, so a step only compares them instead of drawing random
+    numbers. Pass ``seed`` to make alarms reproducible.
+    """
+
+    def __init__(self, seed=alarms.ALARM_SEED):
+        self.size = 0
+        self.rng = numpy.random.default_rng(seed)
+        self.flags = numpy.zeros(0, dtype=numpy.uint8)
+        # Trajectories are keyed by identity, a program loaded again after
+        # it changed is another trajectory
+        self._offsets: dict[programs.Trajectory, int] = {}
+        self._shared_flags = self.flags
+        self._shared: set[programs.Trajectory] = set()
+        self._users: dict[programs.Trajectory, int] = {}
+        self._slot_trajectories: dict[int, programs.Trajectory] = {}
+        # Slots of removed robots, reused by robots added later
+        self._free: list[int] = []
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, numpy.zeros(0, dtype=dtype))
+
+    def use_flags(self, flags: numpy.ndarray,
+                  offsets: dict[programs.Trajectory, int]):
+        """Address trajectories at ``offsets`` of ``flags``.
+
+        Robots of these trajectories use ``flags`` as they are, which may
+        be shared with other fleets or processes, flags of other
+        trajectories are appended to a copy. Call before adding robots.
+        """
+        self.flags = self._shared_flags = flags
+        self._offsets = dict(offsets)
+        self._shared = set(offsets)
+
+    def _add_trajectory(self, trajectory: programs.Trajectory) -> int:
+        offset = self._offsets.get(trajectory)
+        if offset is None:
+            offset = len(self.flags)
+            self._offsets[trajectory] = offset
+            self.flags = numpy.concatenate([self.flags, trajectory.flags])
+        self._users[trajectory] = self._users.get(trajectory, 0) + 1
+        return offset
+
+    def _release_trajectory(self, trajectory: programs.Trajectory):
+        self._users[trajectory] -= 1
+        if self._users[trajectory] or trajectory in self._shared:
+            return
+        del self._users[trajectory]
+        del self._offsets[trajectory]
+        self._compact()
+
+    def _compact(self):
+        """Move flags of trajectories in use together after the shared
+        ones, so flags of released trajectories are freed.
+        """
+        own = [
+            trajectory for trajectory in self._offsets
+            if trajectory not in self._shared
+        ]
+        offset = len(self._shared_flags)
+        parts = [self._shared_flags]
+        for trajectory in own:
+            self._offsets[trajectory] = offset
+            parts.append(trajectory.flags)
+            offset += len(trajectory)
+        self.flags = (
+            numpy.concatenate(parts) if own else self._shared_flags
+        )
+        for slot, trajectory in self._slot_trajectories.items():
+            self.offset[slot] = self._offsets[trajectory]
+
+    def _reserve(self, size: int):
+        capacity = len(self.timer)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        for name, dtype in COLUMNS.items():
+            column = numpy.zeros(capacity, dtype=dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+
+    def add(self, trajectory: programs.Trajectory, program_runtime: float,
+            laser: bool, suction_cup: bool, gripper: bool, work_status: bool,
+            timer: float) -> int:
+        offset = self._add_trajectory(trajectory)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self.size
+            self._reserve(slot + 1)
+            self.size += 1
+
+        self.timer[slot] = timer
+        self.runtime[slot] = 0
+        self.program_runtime[slot] = program_runtime
+        self.speed[slot] = program_runtime / len(trajectory)
+        self.length[slot] = len(trajectory)
+        self.offset[slot] = offset
+        self._slot_trajectories[slot] = trajectory
+        self.position[slot] = 0
+        self.work_status[slot] = work_status
+        self.alarm[slot] = 0x00
+        self.alarm_timer[slot] = 0
+        self.joint_alarm_in[slot] = 0
+        self.motion_alarm_in[slot] = 0
+        self.step_alarm_in[slot] = 0
+        self._schedule_alarms(numpy.array([slot]))
+        self.laser[slot] = laser
+        self.suction_cup[slot] = suction_cup
+        self.gripper[slot] = gripper
+        effector_status = EFFECTOR_STATUS == "True"
+        self.laser_status[slot] = effector_status
+        self.suction_cup_status[slot] = effector_status
+        self.gripper_status[slot] = effector_status
+        return slot
+
+    def remove(self, slot: int):
+        """Stop the robot in ``slot`` and free the slot for reuse.
+
+        Flags of its trajectory are freed when no other robot uses it.
+        """
+        # Without an alarm, nothing resumes the robot until it is reused
+        self.work_status[slot] = False
+        self.alarm[slot] = 0x00
+        self._free.append(slot)
+        self._release_trajectory(self._slot_trajectories.pop(slot))
+
+    def _schedule_alarms(self, slots: numpy.ndarray):
+        """Draw new alarm countdowns for those in ``slots`` that ran out."""
+        joint = slots[self.joint_alarm_in[slots] <= 0]
+        self.joint_alarm_in[joint] = alarms.draw_limit_alarms(
+            self.rng, joint.size
+        )
+        motion = slots[self.motion_alarm_in[slots] <= 0]
+        self.motion_alarm_in[motion] = alarms.draw_limit_alarms(
+            self.rng, motion.size
+        )
+        step = slots[self.step_alarm_in[slots] <= 0]
+        self.step_alarm_in[step], self.step_alarm[step] = (
+            alarms.draw_losing_step_alarms(self.rng, step.size)
+        )
+
+    def step(self, now: float, slots=None) -> numpy.ndarray:
+        """Advance robots in ``slots`` (all by default) to time ``now``.
+
+        Returns slots of robots which were running during this step.
+        """
+        if slots is None:
+            slots = numpy.arange(self.size)
+
+        # Check alarms
+        alarmed = slots[self.alarm[slots] != 0x00]
+        if alarmed.size:
+            waiting = alarmed[
+                now - self.alarm_timer[alarmed] > alarms.ALARM_CLEARED
+            ]
+            self.clear_alarm_in[waiting] -= 1
+            cleared = waiting[self.clear_alarm_in[waiting] <= 0]
+            self.work_status[cleared] = True
+            self.alarm[cleared] = 0x00
+
+        running = slots[self.work_status[slots]]
+        if not running.size:
+            return running
+
+        # Get runtime
+        runtime = numpy.fmod(
+            now - self.timer[running], self.program_runtime[running]
+        )
+        self.runtime[running] = runtime
+        position = numpy.minimum(
+            runtime // self.speed[running], self.length[running] - 1
+        ).astype(numpy.int64)
+
+        # Get new pose
+        self.position[running] = position
+        rows = self.offset[running] + position
+
+        flags = self.flags[rows]
+
+        # Get effectors statuses, disabled effectors stay off
+        self.laser_status[running] = (
+            self.laser[running] & ((flags & programs.LASER) != 0)
+        )
+        self.suction_cup_status[running] = (
+            self.suction_cup[running]
+            & ((flags & programs.SUCTION_CUP) != 0)
+        )
+        self.gripper_status[running] = (
+            self.gripper[running] & ((flags & programs.GRIPPER) != 0)
+        )
+
+        # Checking if alarm could be fired
+        self.joint_alarm_in[running] -= (
+            (flags & programs.JOINT_LIMITS) != 0
+        )
+        self.motion_alarm_in[running] -= (
+            (flags & programs.MOTION_LIMITS) != 0
+        )
+        self.step_alarm_in[running] -= 1
+        alarm = alarms.get_alarms(
+            self.joint_alarm_in[running], self.motion_alarm_in[running],
+            self.step_alarm_in[running], self.step_alarm[running]
+        )
+        fired = alarm != 0x00
+        if fired.any():
+            slots = running[fired]
+            self.alarm[slots] = alarm[fired]
+            self.alarm_timer[slots] = now
+            self.work_status[slots] = False
+            self.clear_alarm_in[slots] = alarms.draw_alarm_clears(
+                self.rng, slots.size
+            )
+            self._schedule_alarms(slots)
+
+        return running
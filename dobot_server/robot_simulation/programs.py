@@ -1,162 +1,211 @@
 import ast
 import os
-import random
-import time
-from typing import Tuple
+import zlib
 
+import numpy
 import pandas
 
-from dobot_server.utils import get_effector
-
-
-PROBABILITY_RANGE: int = int(os.environ.get("PROBABILITY_RANGE", 10000))
-ALARM_CLEARED: int = int(os.environ.get("ALARM_CLEARED", 900))
-ALARMS_RANGE: int = int(os.environ.get("ALARMS_RANGE", 20))
-
-
-class RobotStatus:
-    def __init__(self, pose, alarm, work_status, laser, suction_cup, gripper,
-                 runtime, alarm_timer):
-        self.pose = pose
-        self.alarm = alarm
-        self.work_status = work_status
-        self.laser = get_effector(laser)
-        self.suction_cup = get_effector(suction_cup)
-        self.gripper = get_effector(gripper)
-        self.runtime = runtime
-        self.alarm_timer = alarm_timer
+from dobot_server.robot_simulation import alarms, binary
+
+
+# Bits of per sample flags, effectors on and limits exceeded, where a
+# status update may fire an inverse resolve alarm
+LASER = 1
+SUCTION_CUP = 2
+GRIPPER = 4
+JOINT_LIMITS = 8
+MOTION_LIMITS = 16
+EFFECTORS = LASER | SUCTION_CUP | GRIPPER
+# Binary files store limit bits with the checksum of limits they were
+# computed with, so files converted before limits changed are detected
+LIMITS_CHECKSUM = zlib.crc32(
+    alarms.JOINT_LIMITS.tobytes() + alarms.MOTION_LIMITS.tobytes()
+)
+
+
+def limit_flags(coordinates: numpy.ndarray,
+                joints: numpy.ndarray) -> numpy.ndarray:
+    flags = numpy.zeros(len(coordinates), dtype=numpy.uint8)
+    flags[alarms.limits_exceeded(joints, alarms.JOINT_LIMITS)] |= (
+        JOINT_LIMITS
+    )
+    flags[alarms.limits_exceeded(coordinates, alarms.MOTION_LIMITS)] |= (
+        MOTION_LIMITS
+    )
+    return flags
+
+
+def sample_flags(coordinates: numpy.ndarray, joints: numpy.ndarray,
+                 laser: numpy.ndarray, suction_cup: numpy.ndarray,
+                 gripper: numpy.ndarray) -> numpy.ndarray:
+    flags = limit_flags(coordinates, joints)
+    flags[laser] |= LASER
+    flags[suction_cup] |= SUCTION_CUP
+    flags[gripper] |= GRIPPER
+    flags.setflags(write=False)
+    return flags
+
+
+class Trajectory:
+    """Program file parsed into numeric columns, shared by all its robots.
+
+    ``flags`` holds the bits of effectors on and limits exceeded of every
+    sample, the only values fleets step robots by.
+    """
+
+    def __init__(self, path, coordinates, joints, flags):
+        self.path = path
+        self.coordinates = coordinates
+        self.joints = joints
+        self.flags = flags
+
+    def __len__(self) -> int:
+        return len(self.coordinates)
+
+
+def concatenate_flags(trajectories: list[Trajectory]) \
+        -> tuple[numpy.ndarray, list[int]]:
+    """Return flags of ``trajectories`` in one array and their offsets."""
+    offsets, offset = [], 0
+    for trajectory in trajectories:
+        offsets.append(offset)
+        offset += len(trajectory)
+    if len(trajectories) == 1:
+        # Keep mapped flags mapped instead of copying them
+        return trajectories[0].flags, offsets
+    flags = numpy.concatenate(
+        [trajectory.flags for trajectory in trajectories]
+        or [numpy.zeros(0, dtype=numpy.uint8)]
+    )
+    flags.setflags(write=False)
+    return flags, offsets
+
+
+# Decimals of poses returned as text
+POSE_DECIMALS = 4
+
+# Loaded trajectories keyed by absolute program path
+_trajectories: dict[str, Trajectory] = {}
 
 
 def get_program_data(file: str) -> ...:
     return pandas.read_csv(os.path.abspath(file), delimiter="\t")
 
 
-def get_first_pose(robot) -> str:
-    data = get_program_data(robot.program_path)
-    pose = ast.literal_eval(data.iloc[0, 0])
-    angle = ast.literal_eval(data.iloc[0, 1])
-    pose.append(angle)
+def _list_column(column) -> numpy.ndarray:
+    values = numpy.array(
+        [ast.literal_eval(value) for value in column], dtype=numpy.float64
+    )
+    values.setflags(write=False)
+    return values
+
+
+def _effector_column(column) -> numpy.ndarray:
+    if column.dtype == bool:
+        values = column.to_numpy(dtype=bool)
+    else:
+        values = column.astype(str).str.strip().str.upper().eq("TRUE")
+        values = values.to_numpy(dtype=bool)
+    values.setflags(write=False)
+    return values
+
+
+def read_trajectory(file: str) -> Trajectory:
+    """Parse a program file, without caching it.
+
+    Binary trajectory files are mapped into memory instead of parsed.
+    """
+    path = os.path.abspath(file)
+    if binary.is_binary(path):
+        header = binary.read_header(path)
+        columns = binary.map_columns(path, header)
+        if header["limits"] != LIMITS_CHECKSUM:
+            # Converted with other limits, effector bits are still right
+            flags = (columns["flags"] & EFFECTORS) | limit_flags(
+                columns["coordinates"], columns["joints"]
+            )
+            flags.setflags(write=False)
+            columns["flags"] = flags
+        return Trajectory(path=path, **columns)
+    data = get_program_data(path)
+    coordinates = _list_column(data.iloc[:, 0])
+    joints = _list_column(data.iloc[:, 1])
+    return Trajectory(
+        path=path,
+        coordinates=coordinates,
+        joints=joints,
+        flags=sample_flags(
+            coordinates, joints, _effector_column(data.iloc[:, 2]),
+            _effector_column(data.iloc[:, 3]),
+            _effector_column(data.iloc[:, 4]),
+        ),
+    )
+
+
+def load_trajectory(file: str) -> Trajectory:
+    path = os.path.abspath(file)
+    trajectory = _trajectories.get(path)
+    if trajectory is not None:
+        return trajectory
+
+    trajectory = read_trajectory(path)
+    _trajectories[path] = trajectory
+    return trajectory
+
+
+def register_trajectory(trajectory: Trajectory):
+    """Use ``trajectory`` for its path instead of loading the file."""
+    _trajectories[trajectory.path] = trajectory
+
+
+def release(keep: set[str]):
+    """Forget loaded trajectories except those with paths in ``keep``."""
+    for path in list(_trajectories):
+        if path not in keep:
+            del _trajectories[path]
+
+
+def view(samples: Trajectory, path: str, offset: int, length: int) \
+        -> Trajectory:
+    """Return trajectory of ``path`` stored at ``offset`` of ``samples``,
+    without copying it.
+    """
+    end = offset + length
+    return Trajectory(
+        path=path,
+        coordinates=samples.coordinates[offset:end],
+        joints=samples.joints[offset:end],
+        flags=samples.flags[offset:end],
+    )
+
+
+def share_trajectories(files: list[str]) \
+        -> tuple[numpy.ndarray | None, dict[Trajectory, int]]:
+    """Load ``files`` and concatenate their flags.
+
+    Fleets using the flags through ``Fleet.use_flags`` do not keep copies
+    of their own, trajectories stay as loaded. Returns the flags, None
+    without files, and offsets of the loaded trajectories in them.
+    """
+    trajectories = {}
+    for file in files:
+        trajectory = load_trajectory(file)
+        trajectories[trajectory.path] = trajectory
+    if not trajectories:
+        return None, {}
+    trajectories = list(trajectories.values())
+    flags, offsets = concatenate_flags(trajectories)
+    return flags, dict(zip(trajectories, offsets))
+
+
+def format_pose(coordinates: numpy.ndarray, joints: numpy.ndarray) -> str:
+    # Rounding hides float32 noise of binary trajectories, 66.65 instead
+    # of 66.6500015258789
+    pose = coordinates.astype(numpy.float64).round(POSE_DECIMALS).tolist()
+    pose.append(joints.astype(numpy.float64).round(POSE_DECIMALS).tolist())
     return f"{pose}"
 
 
-def losing_step_alarm() -> ...:
-    if random.randint(1, 100*PROBABILITY_RANGE) == 1:
-        return 0x50
-    if random.randint(1, 100*PROBABILITY_RANGE) == 2:
-        return 0x51
-    if random.randint(1, 100*PROBABILITY_RANGE) == 3:
-        return 0x52
-    if random.randint(1, 100*PROBABILITY_RANGE) == 4:
-        return 0x53
-    return False
-
-
-# Movement limits:
-# coordinates[0]: [-50, 350], coordinates[1]: [-50, 350],
-# coordinates[2]: [-200, 200], coordinates[-130, 130]
-def motion_inverse_resolve_alarm(coordinates: list[int]) -> bool:
-    if (
-            coordinates[0] > 347
-            or coordinates[0] < -47
-            or coordinates[1] > 347
-            or coordinates[1] < -47
-            or coordinates[2] > 197
-            or coordinates[2] < -197
-            or coordinates[3] > 128
-            or coordinates[3] < -128
-    ):
-        alert = random.randint(1, PROBABILITY_RANGE)
-        if alert == PROBABILITY_RANGE:
-            return True
-
-    return False
-
-
-# Joint limits:
-# joints[0]: [-90, 90], joints[1]: [0, 85],
-# joints[2]: [-10, 90], joints[-90, 90]
-def inverse_resolve_alarm(joints: list[int]) -> bool:
-    if (
-            joints[0] > 88
-            or joints[0] < -88
-            or joints[1] > 82
-            or joints[1] < 3
-            or joints[2] > 88
-            or joints[2] < -3
-            or joints[3] > 88
-            or joints[3] < -88
-    ):
-        alert = random.randint(1, PROBABILITY_RANGE)
-        if alert == PROBABILITY_RANGE:
-            return True
-
-    return False
-
-
-def get_alarm(robot) -> Tuple[int, float]:
-    pose = ast.literal_eval(robot.pose)
-    joints = pose[4]
-
-    # Inverse resolve alert
-    if inverse_resolve_alarm(joints):
-        return 0x12, time.time()
-
-    if motion_inverse_resolve_alarm(pose):
-        return 0x21, time.time()
-
-    step_alarm = losing_step_alarm()
-    if step_alarm:
-        return step_alarm, time.time()
-
-    # Return no alarm
-    return 0x00, 0.0
-
-
-def calc_status(robot):
-
-    # Load robot_simulation status
-    result: RobotStatus = RobotStatus(robot.pose, robot.alarm,
-                                      robot.work_status, robot.laser,
-                                      robot.suction_cup, robot.gripper,
-                                      robot.runtime, robot.alarm_timer)
-
-    # Check alarms
-    if robot.alarm != 0x00:
-        print(time.time() - robot.alarm_timer)
-        if (time.time() - robot.alarm_timer) > ALARM_CLEARED:
-            if random.randint(1, ALARMS_RANGE) == ALARMS_RANGE:
-                result.work_status = True
-                result.alarm = 0x00
-    if not result.work_status:
-        return result
-
-    # Get runtime
-    result.runtime = time.time() - robot.timer
-    while result.runtime > robot.program_runtime:
-        result.runtime = result.runtime - robot.program_runtime
-    data = get_program_data(robot.program_path)
-    position = int(result.runtime // robot.speed)
-
-    # Get new pose
-    pose = ast.literal_eval(data.iloc[position, 0])
-    angle = ast.literal_eval(data.iloc[position, 1])
-    pose.append(angle)
-    result.pose = str(pose)
-
-    # Get effectors statuses
-    if robot.laser[0]:
-        laser_status = [robot.laser[0], data.iloc[position, 2]]
-        result.laser = laser_status
-    if robot.suction_cup[0]:
-        suction_cup_status = [robot.suction_cup[0], data.iloc[position, 3]]
-        result.suction_cup = suction_cup_status
-    if robot.gripper[0]:
-        gripper_status = [robot.gripper[0], data.iloc[position, 4]]
-        result.gripper = gripper_status
-
-    # Checking if alarm could be fired
-    result.alarm, result.alarm_timer = get_alarm(robot)
-    if result.alarm != 0x00:
-        result.work_status = False
-
-    return result
+def get_first_pose(robot) -> str:
+    trajectory = robot.trajectory
+    return format_pose(trajectory.coordinates[0], trajectory.joints[0])
@@ -1,8 +1,11 @@
 import os
 import time
 
+import numpy
+
 from dobot_server.utils import get_effector
 from dobot_server.robot_simulation import programs
+from dobot_server.robot_simulation.fleet import Fleet
 
 DEFAULT_WORK_STATUS: bool = bool(os.getenv("DEFAULT_WORK_STATUS", True))
 default_alarm = 0x00
@@ -10,6 +13,8 @@ status = False
 
 
 class Robot:
+    """View of one robot whose simulation state lives in a ``Fleet``."""
+
     def __init__(
         self,
         label,
@@ -22,16 +27,23 @@ class Robot:
         suction_cup,
         gripper,
         program_path,
-        program_time
+        program_time,
+        fleet: Fleet,
+        refresh_rate=None,
     ):
         # Values not available for clients
         self.program_path = program_path
+        self.trajectory = programs.load_trajectory(program_path)
         self.program_lines = self.get_program_lines()
         self.program_runtime = program_time
-        self.runtime = 0
-        self.timer = time.time()
         self.speed = self.get_speed()
-        self.alarm_timer = 0
+        self.refresh_rate = refresh_rate
+        self.fleet = fleet
+        self.slot = fleet.add(
+            self.trajectory, program_time, laser, suction_cup, gripper,
+            DEFAULT_WORK_STATUS, time.time()
+        )
+        self._slots = numpy.array([self.slot])
         # Values for clients
         self.label = label
         self.sn = sn
@@ -39,41 +51,90 @@ class Robot:
         self.id = robot_id
         self.name = name
         self.home = self.get_home()
-        self.pose = self.home
-        self.alarm = default_alarm
+        self._pose_text = self.home
+        self._pose_text_position = 0
         self.program = program
-        self.work_status = DEFAULT_WORK_STATUS
-        self.laser = get_effector(laser)
-        self.suction_cup = get_effector(suction_cup)
-        self.gripper = get_effector(gripper)
 
     def get_home(self) -> str:
         self.home = programs.get_first_pose(self)
         return self.home
 
+    @property
+    def timer(self) -> float:
+        return float(self.fleet.timer[self.slot])
+
+    @property
+    def runtime(self) -> float:
+        return float(self.fleet.runtime[self.slot])
+
+    @property
+    def position(self) -> int:
+        return int(self.fleet.position[self.slot])
+
+    @property
+    def coordinates(self) -> numpy.ndarray:
+        return self.trajectory.coordinates[self.position]
+
+    @property
+    def joints(self) -> numpy.ndarray:
+        return self.trajectory.joints[self.position]
+
+    @property
+    def pose(self) -> str:
+        # Text form is only built for OPC UA clients and only after a move
+        position = self.position
+        if self._pose_text_position != position:
+            self._pose_text = programs.format_pose(
+                self.trajectory.coordinates[position],
+                self.trajectory.joints[position]
+            )
+            self._pose_text_position = position
+        return self._pose_text
+
+    @property
+    def alarm(self) -> int:
+        return int(self.fleet.alarm[self.slot])
+
+    @property
+    def alarm_timer(self) -> float:
+        return float(self.fleet.alarm_timer[self.slot])
+
+    @property
+    def work_status(self) -> bool:
+        return bool(self.fleet.work_status[self.slot])
+
+    @property
+    def laser(self) -> list:
+        return get_effector(
+            bool(self.fleet.laser[self.slot]),
+            bool(self.fleet.laser_status[self.slot])
+        )
+
+    @property
+    def suction_cup(self) -> list:
+        return get_effector(
+            bool(self.fleet.suction_cup[self.slot]),
+            bool(self.fleet.suction_cup_status[self.slot])
+        )
+
+    @property
+    def gripper(self) -> list:
+        return get_effector(
+            bool(self.fleet.gripper[self.slot]),
+            bool(self.fleet.gripper_status[self.slot])
+        )
+
     def change_work_status(self, new_work_status: bool):
-        self.work_status = new_work_status
+        self.fleet.work_status[self.slot] = new_work_status
         self.new_status()
         return
 
     def get_program_lines(self) -> int:
-        # file = os.path.abspath(self.program_path)
-        with open(self.program_path, "r") as f:
-            lines = len(f.readlines()) - 1
-        return lines
+        return len(self.trajectory)
 
     def get_speed(self) -> float:
         return self.program_runtime / self.program_lines
 
     def new_status(self):
-        new_status: programs.RobotStatus = programs.calc_status(self)
-        self.pose = new_status.pose
-        self.alarm = new_status.alarm
-        self.work_status = new_status.work_status
-        self.runtime = new_status.runtime
-        self.alarm_timer = new_status.alarm_timer
-        self.laser = new_status.laser
-        self.suction_cup = new_status.suction_cup
-        self.gripper = new_status.gripper
-
+        self.fleet.step(time.time(), self._slots)
         return
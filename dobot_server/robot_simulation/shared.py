@@ -0,0 +1,104 @@
+from multiprocessing import shared_memory
+
+import numpy
+
+from dobot_server.robot_simulation import programs
+
+
+# Columns of trajectories stored in the block: type and values per sample,
+# float32 as in binary trajectory files
+_COLUMNS = [
+    ("coordinates", numpy.float32, 4),
+    ("joints", numpy.float32, 4),
+    ("flags", numpy.uint8, 1),
+]
+
+
+class SharedSamples:
+    """Samples of trajectories in one block of shared memory.
+
+    The creating process copies trajectories into the block once, other
+    processes attach to it by ``spec`` and get read-only views, so every
+    process maps the same physical copy of all programs and computes
+    nothing of its own.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, spec: dict):
+        self.memory = memory
+        self.spec = spec
+        columns = self._columns(memory, spec["length"])
+        for values in columns.values():
+            values.setflags(write=False)
+        self.samples = programs.Trajectory(path=None, **columns)
+        self._trajectories = {
+            programs.view(self.samples, path, offset, length): offset
+            for path, (offset, length) in spec["programs"].items()
+        }
+
+    @staticmethod
+    def _size(length: int) -> int:
+        return sum(
+            numpy.dtype(dtype).itemsize * width * length
+            for _, dtype, width in _COLUMNS
+        )
+
+    @staticmethod
+    def _columns(memory: shared_memory.SharedMemory,
+                 length: int) -> dict[str, numpy.ndarray]:
+        columns = {}
+        position = 0
+        for name, dtype, width in _COLUMNS:
+            shape = (length, width) if width > 1 else (length,)
+            columns[name] = numpy.ndarray(
+                shape, dtype=dtype, buffer=memory.buf, offset=position
+            )
+            position += columns[name].nbytes
+        return columns
+
+    @classmethod
+    def create(cls, trajectories: list[programs.Trajectory]) \
+            -> "SharedSamples":
+        length = sum(len(trajectory) for trajectory in trajectories)
+        memory = shared_memory.SharedMemory(
+            create=True, size=max(cls._size(length), 1)
+        )
+        # Trajectories are copied into place, mapped files are read once
+        # and never concatenated on the heap
+        columns = cls._columns(memory, length)
+        offsets, offset = {}, 0
+        for trajectory in trajectories:
+            end = offset + len(trajectory)
+            for name, values in columns.items():
+                values[offset:end] = getattr(trajectory, name)
+            offsets[trajectory.path] = [offset, len(trajectory)]
+            offset = end
+        del columns
+        spec = {"name": memory.name, "length": length, "programs": offsets}
+        return cls(memory, spec)
+
+    @classmethod
+    def attach(cls, spec: dict) -> "SharedSamples":
+        # Processes started by multiprocessing share the resource tracker
+        # of the creating process, which removes the block when all exit
+        memory = shared_memory.SharedMemory(name=spec["name"])
+        return cls(memory, spec)
+
+    @property
+    def flags(self) -> numpy.ndarray:
+        return self.samples.flags
+
+    @property
+    def offsets(self) -> dict[programs.Trajectory, int]:
+        return dict(self._trajectories)
+
+    def trajectories(self) -> list[programs.Trajectory]:
+        """Return views of the shared trajectories, without copying."""
+        return list(self._trajectories)
+
+    def close(self):
+        self.samples = None
+        self._trajectories = None
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Awaitable, Callable
+
+import numpy
+
+
+SCHEDULER_RESOLUTION: float = float(
+    os.environ.get("SCHEDULER_RESOLUTION", 0.05)
+)
+# Longest sleep, so robots added while sleeping are not left waiting
+MAX_SLEEP: float = 1.0
+# Fractional part of multiples of the golden ratio spreads any number of
+# robots evenly over their period
+_GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+_logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Spreads robot status updates over their refresh periods.
+
+    Every robot gets its own period and a phase within it, so robots
+    sharing a period are not updated all at once. Due times are kept on
+    the monotonic clock and always advance by whole periods, so the time
+    spent updating does not accumulate as drift. An update coming a whole
+    period or more late counts as missed deadlines.
+    """
+
+    def __init__(self, resolution: float = SCHEDULER_RESOLUTION):
+        self.resolution = resolution
+        self.slots = numpy.zeros(0, dtype=numpy.int64)
+        self.period = numpy.zeros(0, dtype=numpy.float64)
+        self.due = numpy.zeros(0, dtype=numpy.float64)
+        self.missed = 0
+        self.lag = 0.0
+
+    def add(self, slot: int, period: float, now: float | None = None):
+        if now is None:
+            now = time.monotonic()
+        phase = (len(self.slots) * _GOLDEN_RATIO) % 1 * period
+        self.slots = numpy.append(self.slots, slot)
+        self.period = numpy.append(self.period, period)
+        self.due = numpy.append(self.due, now + phase)
+
+    def remove(self, slots):
+        """Stop scheduling updates of ``slots``."""
+        keep = ~numpy.isin(self.slots, slots)
+        self.slots = self.slots[keep]
+        self.period = self.period[keep]
+        self.due = self.due[keep]
+
+    def next_due(self) -> float:
+        return float(self.due.min()) if self.due.size else math.inf
+
+    def pop_due(self, now: float) -> numpy.ndarray:
+        """Return slots due at ``now`` and schedule their next update."""
+        due = numpy.flatnonzero(self.due <= now)
+        if not due.size:
+            self.lag = 0.0
+            return self.slots[due]
+
+        late = now - self.due[due]
+        skipped = numpy.floor(late / self.period[due])
+        self.due[due] += (skipped + 1) * self.period[due]
+        self.lag = float(late.max())
+        missed = int(skipped.sum())
+        if missed:
+            self.missed += missed
+            _logger.warning(
+                f"{missed} robot updates missed their deadline, "
+                f"lagging {self.lag:.3f} seconds."
+            )
+        return self.slots[due]
+
+    async def run(self, update: Callable[[numpy.ndarray], Awaitable]):
+        """Call ``update`` with slots of due robots, forever."""
+        while True:
+            slots = self.pop_due(time.monotonic())
+            if slots.size:
+                await update(slots)
+            delay = self.next_due() - time.monotonic()
+            await asyncio.sleep(max(min(delay, MAX_SLEEP), self.resolution))
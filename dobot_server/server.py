@@ -2,51 +2,43 @@ import asyncio
 import dataclasses
 import logging
 import os
-import re
 import socket
+import time
 
 import yaml
 
 from asyncua import Server, ua
 from asyncua.common.methods import uamethod
-from asyncua.crypto.cert_gen import setup_self_signed_certificate
 from asyncua.server.user_managers import CertificateUserManager
-from cryptography.x509.oid import ExtendedKeyUsageOID
-from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
-from dobot_server.robot_simulation import robot as r
+from dobot_server import address_space, logs, sharding, templates
+from dobot_server.capture import InteractionCapture
+from dobot_server.certificates import setup_certificate
+from dobot_server.lazy import LazyUpdates
+from dobot_server.metrics import Metrics
+from dobot_server.profiling import PROFILE_ON_START, Profiler
+from dobot_server.publisher import Publisher
+from dobot_server.registry import SEPARATORS, RobotRegistry
+from dobot_server.reload import CONFIG_POLL_INTERVAL, ConfigWatcher
+from dobot_server.robot_simulation import alarms, programs, robot as r
+from dobot_server.scheduler import Scheduler
+from dobot_server.robot_simulation.fleet import Fleet
 
 
 CONFIG_FILE: str = str(os.environ.get(
     "CONFIG_FILE", "/server/dobot_server/files/config.yaml"
 ))
 ROOT_FOLDER: str = str(os.environ.get("ROOT_FOLDER", "/server/"))
-robots = []
-server_robots = {}
+# Debug mode of asyncio, reports slow callbacks but slows everything down
+ASYNCIO_DEBUG: bool = str(
+    os.environ.get("ASYNCIO_DEBUG", False)
+).lower() in ("true", "1")
 
 
-def setup_logger():
-    logger = logging.getLogger("__name__")
-    logger.setLevel(logging.DEBUG)
-    formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
-    # file_handler = RotatingFileHandler(
-    #     "server.log", maxBytes=5 * 1024 * 1024, backupCount=2
-    # )
-    file_handler = RotatingFileHandler("server.log")
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
-    console_handler = logging.StreamHandler()
-
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-
-    return logger
-
-
-_logger = setup_logger()
+_logger = logging.getLogger("dobot_server.server")
+# The LibYAML parser is many times faster where PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 @dataclasses.dataclass(frozen=True)
@@ -63,6 +55,14 @@ class ServerConfig:
     locality_name: str
     organization_name: str
     refresh_rate: int
+    lazy_updates: bool = False
+    renew_certificate: bool = False
+    capture_file: str | None = "interactions.jsonl"
+    metrics_address: str = "127.0.0.1"
+    metrics_port: int | None = None
+    workers: int = 1
+    certificate_name: str = "server"
+    legacy_browse_names: bool = True
 
     @classmethod
     def from_dict(cls, data: dict) -> "ServerConfig":
@@ -80,10 +80,15 @@ class RobotConfig:
     laser: bool
     suction_cup: bool
     gripper: bool
+    refresh_rate: float | None = None
+    groups: list[str] = dataclasses.field(default_factory=list)
 
     @classmethod
     def from_dict(cls, data: dict) -> "RobotConfig":
-        return cls(**data)
+        try:
+            return cls(**data)
+        except TypeError as e:
+            raise ValueError(f"Robot {data.get('label')!r}: {e}") from None
 
 
 @dataclasses.dataclass(frozen=True)
@@ -105,159 +110,53 @@ class Config:
 
     @classmethod
     def from_dict(cls, data: dict) -> "Config":
-        return cls(
+        config = cls(
             server=ServerConfig.from_dict(data["server"]),
             programs=[ProgramsConfig.from_dict(p) for p in data["programs"]],
-            robots=[RobotConfig.from_dict(rob) for rob in data["robots"]],
+            robots=[
+                RobotConfig.from_dict(rob)
+                for rob in templates.expand_robots(data["robots"])
+            ],
         )
+        config.validate()
+        return config
+
+    def validate(self):
+        """Raise ValueError unless every robot can run its program."""
+        numbers = [p.program for p in self.programs]
+        if len(set(numbers)) != len(numbers):
+            raise ValueError("Program numbers are not unique")
+        known = set(numbers)
+        labels = set()
+        for robot in self.robots:
+            if robot.label in labels:
+                raise ValueError(f"Robot label {robot.label} is not unique")
+            labels.add(robot.label)
+            if robot.program not in known:
+                raise ValueError(
+                    f"Robot {robot.label} runs unknown program "
+                    f"{robot.program}"
+                )
 
+    def program_paths(self) -> list[str]:
+        """Return paths of programs run by robots."""
+        used = {robot.program for robot in self.robots}
+        return [p.path for p in self.programs if p.program in used]
 
-@uamethod
-def stop_robot(node, value: str):
-    changed = []
-    values = re.split(r",+\s+|,+|\s+", value)
-    for value in values:
-        for robot in robots:
-            if robot.label == value:
-                if robot.work_status:
-                    robot.change_work_status(False)
-                    _logger.info(f"Robot {robot.label} stopped")
-                    changed.append(value)
-    return f"{changed}"
-
-
-@uamethod
-def stop_robots(node):
-    for robot in robots:
-        if robot.work_status:
-            robot.change_work_status(False)
-            _logger.info(f"Robot {robot.label} stopped")
-    return 0
-
-
-@uamethod
-def resume_robot(node, value: str):
-    changed = []
-    values = re.split(r",+\s+|,+|\s+", value)
-    for value in values:
-        for robot in robots:
-            if robot.label == value:
-                if not robot.work_status:
-                    robot.change_work_status(True)
-                    _logger.info(f"Robot {robot.label} resumed")
-                    changed.append(value)
-    return f"{changed}"
-
-
-@uamethod
-def resume_robots(node):
-    for robot in robots:
-        if not robot.work_status:
-            robot.change_work_status(True)
-            _logger.info(f"Robot {robot.label} resumed")
-    return 0
-
-
-@uamethod
-async def get_realtime_pose(node, value):
-    values = re.split(r",+\s+|,+|\s+", value)
-    if not values:
-        return "Wrong format"
-    if len(values) > 1:
-        return "Only one object at a time"
-    for robot in robots:
-        if robot.label == values[0]:
-            robot.new_status()
-            return f"{robot.pose}"
-    return "Something went wrong"
-
-
-@uamethod
-async def list_robots(node):
-    result = []
-    for robot in server_robots:
-        result.append(robot)
-    return f"{result}"
-
-
-async def add_robot(robots_idx, server, robot) -> dict:
-    # Values for observation
-    robot_node = await server.nodes.objects.add_object(robots_idx, robot.label)
-    robot_id = await robot_node.add_variable(robots_idx, f"id_{robot.label}", robot.id)
-    robot_sn = await robot_node.add_variable(robots_idx, f"sn_{robot.label}", robot.sn)
-    robot_name = await robot_node.add_variable(
-        robots_idx, f"name_{robot.label}", robot.name
-    )
-    robot_version = await robot_node.add_variable(
-        robots_idx, f"version_{robot.label}", robot.version
-    )
-    robot_program = await robot_node.add_variable(
-        robots_idx, f"program_{robot.label}", robot.program
-    )
-    robot_pose = await robot_node.add_variable(
-        robots_idx, f"pose_{robot.label}", robot.pose
-    )
-    robot_alarm = await robot_node.add_variable(
-        robots_idx, f"alarm_{robot.label}", robot.alarm
-    )
-    robot_home = await robot_node.add_variable(
-        robots_idx, f"home_position_{robot.label}", robot.home
-    )
-    robot_status = await robot_node.add_variable(
-        robots_idx, f"work_status_{robot.label}", robot.work_status
-    )
-    robot_laser = await robot_node.add_variable(
-        robots_idx, f"laser_{robot.label}", f"{robot.laser}"
-    )
-    robot_suction_cup = await robot_node.add_variable(
-        robots_idx, f"suction_cup_{robot.label}", f"{robot.suction_cup}"
-    )
-    robot_gripper = await robot_node.add_variable(
-        robots_idx, f"gripper_{robot.label}", f"{robot.gripper}"
-    )
 
-    return {
-        "node": robot_node,
-        "id": robot_id,
-        "name": robot_name,
-        "sn": robot_sn,
-        "version": robot_version,
-        "program": robot_program,
-        "pose": robot_pose,
-        "alarm": robot_alarm,
-        "home": robot_home,
-        "status": robot_status,
-        "laser": robot_laser,
-        "suction_cup": robot_suction_cup,
-        "gripper": robot_gripper,
-    }
+def _string_array(name: str) -> ua.Argument:
+    argument = ua.Argument()
+    argument.Name = name
+    argument.DataType = ua.NodeId(ua.ObjectIds.String)
+    argument.ValueRank = ua.ValueRank.OneDimension
+    argument.ArrayDimensions = [0]
+    return argument
 
 
-async def add_robots(robots_idx, server):
-    for robot in robots:
-        server_robot = await add_robot(robots_idx, server, robot)
-        server_robots[robot.label] = server_robot
-    return
-
-
-def create_robot(config: list[RobotConfig], program: list[ProgramsConfig]):
-    for c in config:
-        p_config = [p for p in program if p.program == c.program]
-        robot = r.Robot(
-            label=c.label,
-            robot_id=c.id,
-            sn=c.serial_number,
-            version=c.version,
-            program=c.program,
-            name=c.name,
-            laser=c.laser,
-            suction_cup=c.suction_cup,
-            gripper=c.gripper,
-            program_path=p_config[0].path,
-            program_time=p_config[0].time_length
-        )
-        robots.append(robot)
-    return
+def _labels(selected: list) -> ua.Variant:
+    return ua.Variant(
+        [robot.label for robot in selected], ua.VariantType.String
+    )
 
 
 def get_security_policy(policy_names: list) -> ...:
@@ -290,154 +189,461 @@ def get_security_policy(policy_names: list) -> ...:
         return policy
 
 
-async def main():
-
-    if os.path.exists(f"{ROOT_FOLDER}/dobot_server/files/certificates/server.crt"):
-        os.remove(f"{ROOT_FOLDER}/dobot_server/files/certificates/server.crt")
-    if os.path.exists(f"{ROOT_FOLDER}/dobot_server/files/certificates/server.pem"):
-        os.remove(f"{ROOT_FOLDER}/dobot_server/files/certificates/server.pem")
-
-    with open(os.path.abspath(CONFIG_FILE)) as f:
-        raw_config = yaml.safe_load(f)
-    config = Config.from_dict(raw_config)
-
-    # Set up user_manager and server
-    if config.server.security_policy:
-        cert_user_manager = CertificateUserManager()
-        admin_cert = Path(os.path.abspath(
-            f"{ROOT_FOLDER}/dobot_server/files/certificates/admin.crt"
-        ))
-        await cert_user_manager.add_user(admin_cert, name="admin")
-        server = Server(user_manager=cert_user_manager)
-    else:
-        server = Server()
-
-    await server.init()
-    server.set_endpoint(config.server.server_endpoint)
-    server.set_server_name(config.server.server_name)
-
-    # Set up namespace for log server
-    log_uri = config.server.log_server_url
-    log_idx = await server.register_namespace(log_uri)
-    # Set up namespace for robotic arms
-    robots_uri = config.server.robots_url
-    robots_idx = await server.register_namespace(robots_uri)
-
-    # Set server security
-    policy = get_security_policy(config.server.security_policy)
-
-    if policy:
-        country = config.server.country_name
-        state = config.server.state_or_province_name
-        locality = config.server.locality_name
-        organization = config.server.organization_name
-        server.set_security_policy(policy)
-        _logger.info(f"Server security policy set to: {policy}")
-        host_name = socket.gethostname()
-        server_api_uri = f"{config.server.server_app_uri}@{host_name}"
-        server_cert = Path(os.path.abspath(
-            f"{ROOT_FOLDER}/dobot_server/files/certificates/server.crt"
-        ))
-        server_key = Path(os.path.abspath(f"{ROOT_FOLDER}/dobot_server/files/certificates/server.pem"))
-        await setup_self_signed_certificate(
-            server_key,
-            server_cert,
-            server_api_uri,
-            host_name,
-            [ExtendedKeyUsageOID.CLIENT_AUTH, ExtendedKeyUsageOID.SERVER_AUTH],
-            {
-                "countryName": f"{country.strip()}",
-                "stateOrProvinceName": f"{state.strip()}",
-                "localityName": f"{locality.strip()}",
-                "organizationName": f"{organization.strip()}",
-            },
-        )
-        # Load server certificate and private key
-        await server.load_certificate(str(server_cert))
-        await server.load_private_key(str(server_key))
-    else:
-        _logger.warning("None security policy has been set!")
-
-    # Create robots
-    create_robot(config.robots, config.programs)
-    # Add robots to server
-    await add_robots(robots_idx, server)
-
-    # Add methods
-    # Add method for stopping one and more robots
-    await server.nodes.objects.add_method(
-        ua.NodeId("stop_robot", robots_idx),
-        ua.QualifiedName("stop_robot", robots_idx),
-        stop_robot,
-        [ua.VariantType.String],
-        [ua.VariantType.String],
-    )
-    # Add method for stopping all robots
-    await server.nodes.objects.add_method(
-        ua.NodeId("stop_all_robots", robots_idx),
-        ua.QualifiedName("stop_all_robots", robots_idx),
-        stop_robots,
-        [ua.VariantType.Null],
-        [ua.VariantType.Int16],
-    )
-    # Add method for resuming one and more robots
-    await server.nodes.objects.add_method(
-        ua.NodeId("resume_robot", robots_idx),
-        ua.QualifiedName("resume_robot", robots_idx),
-        resume_robot,
-        [ua.VariantType.String],
-        [ua.VariantType.String],
-    )
-    # Add method for resuming all robots
-    await server.nodes.objects.add_method(
-        ua.NodeId("resume_all_robots", robots_idx),
-        ua.QualifiedName("resume_all_robots", robots_idx),
-        resume_robots,
-        [ua.VariantType.Null],
-        [ua.VariantType.Int16],
-    )
-    # Add method for getting real time pose
-    await server.nodes.objects.add_method(
-        ua.NodeId("realtime_pose", robots_idx),
-        ua.QualifiedName("realtime_pose", robots_idx),
-        get_realtime_pose,
-        [ua.VariantType.String],
-        [ua.VariantType.String],
-    )
-    # Add method for listing all server robots
-    await server.nodes.objects.add_method(
-        ua.NodeId("list_robots", robots_idx),
-        ua.QualifiedName("list_robots", robots_idx),
-        list_robots,
-        [ua.VariantType.Null],
-        [ua.VariantType.String],
+def load_configs(path: str = CONFIG_FILE) -> list[Config]:
+    """Return configs of all servers declared in the config file.
+
+    The file describes either one server by ``server`` and ``robots``, or
+    several by a ``servers`` list of such pairs. Servers of the list
+    share top level ``programs`` unless they have their own. They get
+    certificate names ``server_0``, ``server_1`` and capture files
+    ``interactions.0.jsonl``, ``interactions.1.jsonl`` and so on by
+    default.
+    """
+    with open(os.path.abspath(path)) as f:
+        raw_config = yaml.load(f, Loader=_YAML_LOADER)
+    if "servers" not in raw_config:
+        return [Config.from_dict(raw_config)]
+    configs = []
+    for index, item in enumerate(raw_config["servers"]):
+        data = {"programs": raw_config.get("programs", []), **item}
+        data["server"] = {
+            "certificate_name": f"server_{index}",
+            "capture_file": f"interactions.{index}.jsonl",
+            **item["server"],
+        }
+        configs.append(Config.from_dict(data))
+    return configs
+
+
+def setup_server_certificate(config: ServerConfig) -> tuple[Path, Path]:
+    """Generate the server key and certificate unless valid ones exist.
+
+    Returns paths of the key and the certificate.
+    """
+    host_name = socket.gethostname()
+    server_api_uri = f"{config.server_app_uri}@{host_name}"
+    certificates = f"{ROOT_FOLDER}/dobot_server/files/certificates"
+    name = config.certificate_name
+    server_cert = Path(os.path.abspath(f"{certificates}/{name}.crt"))
+    server_key = Path(os.path.abspath(f"{certificates}/{name}.pem"))
+    country = config.country_name
+    state = config.state_or_province_name
+    locality = config.locality_name
+    organization = config.organization_name
+    setup_certificate(
+        server_key,
+        server_cert,
+        server_api_uri,
+        host_name,
+        {
+            "countryName": f"{country.strip()}",
+            "stateOrProvinceName": f"{state.strip()}",
+            "localityName": f"{locality.strip()}",
+            "organizationName": f"{organization.strip()}",
+        },
+        config.renew_certificate,
     )
+    return server_key, server_cert
 
-    _logger.info("Starting server!")
 
-    refresh_rate = config.server.refresh_rate
-    if refresh_rate is None:
-        refresh_rate = 10
+def _robot_programs(config: Config) -> dict[str, tuple]:
+    # Config of every robot with config of its program, by label
+    program_configs = {p.program: p for p in config.programs}
+    return {
+        robot.label: (robot, program_configs.get(robot.program))
+        for robot in config.robots
+    }
 
-    async with server:
-        while True:
-            for robot in robots:
-                server_r = server_robots[robot.label]
-                robot.new_status()
 
-                await server_r["pose"].write_value(robot.pose)
-                await server_r["alarm"].write_value(robot.alarm)
-                await server_r["status"].write_value(robot.work_status)
-                await server_r["laser"].write_value(f"{robot.laser}")
-                await server_r["suction_cup"].write_value(f"{robot.suction_cup}")
-                await server_r["gripper"].write_value(f"{robot.gripper}")
+class Persona:
+    """One honeypot server with its own endpoint, name, namespaces,
+    security policy and robots.
+
+    Several personas run in one event loop. They share the trajectory
+    cache, the ``flags`` their fleets address programs in, the logging
+    pipeline and the profiler, everything else is their own. ``seed``
+    makes the alarms of the fleet reproducible.
+    """
+
+    def __init__(self, config: Config, flags=None,
+                 offsets: dict[programs.Trajectory, int] | None = None,
+                 seed: int | None = alarms.ALARM_SEED):
+        self.config = config
+        self.registry = RobotRegistry()
+        self.server_robots = {}
+        self.fleet = Fleet(seed)
+        if flags is not None:
+            self.fleet.use_flags(flags, offsets)
+        self.publisher = Publisher(self.fleet)
+        self.scheduler = Scheduler()
+        self.metrics = Metrics()
+        self.server = None
+        self.robots_idx = None
+        self.robot_type = None
+        self.lazy_updates = None
+        # Set once the server runs and robots can be reconfigured
+        self.ready = asyncio.Event()
+        self.log = logs.ExtraAdapter(
+            _logger, {"server_name": config.server.server_name}
+        )
 
-            _logger.debug(f"Sleeping {refresh_rate} seconds.")
-            await asyncio.sleep(refresh_rate)
+    def stop_robot(self, node, value: str):
+        changed = []
+        for robot in self.registry.select(value):
+            if robot.work_status:
+                robot.change_work_status(False)
+                self.log.info(f"Robot {robot.label} stopped")
+                changed.append(robot)
+        return _labels(changed)
+
+    def stop_robots(self, node):
+        for robot in self.registry:
+            if robot.work_status:
+                robot.change_work_status(False)
+                self.log.info(f"Robot {robot.label} stopped")
+        return 0
+
+    def resume_robot(self, node, value: str):
+        changed = []
+        for robot in self.registry.select(value):
+            if not robot.work_status:
+                robot.change_work_status(True)
+                self.log.info(f"Robot {robot.label} resumed")
+                changed.append(robot)
+        return _labels(changed)
+
+    def resume_robots(self, node):
+        for robot in self.registry:
+            if not robot.work_status:
+                robot.change_work_status(True)
+                self.log.info(f"Robot {robot.label} resumed")
+        return 0
+
+    async def get_realtime_pose(self, node, value):
+        # Answers are those of the original server, clients may rely on them
+        if len(SEPARATORS.split(value)) > 1:
+            return "Only one object at a time"
+        selected = self.registry.select(value)
+        if not selected:
+            return "Something went wrong"
+        if len(selected) > 1:
+            return "Only one object at a time"
+        robot = selected[0]
+        robot.new_status()
+        return f"{robot.pose}"
+
+    async def list_robots(self, node):
+        return _labels(self.registry.robots)
+
+    def create_robots(self, config: list[RobotConfig],
+                      program: list[ProgramsConfig]) -> list:
+        program_configs = {p.program: p for p in program}
+        robots = []
+        for c in config:
+            p_config = program_configs[c.program]
+            robot = r.Robot(
+                label=c.label,
+                robot_id=c.id,
+                sn=c.serial_number,
+                version=c.version,
+                program=c.program,
+                name=c.name,
+                laser=c.laser,
+                suction_cup=c.suction_cup,
+                gripper=c.gripper,
+                program_path=p_config.path,
+                program_time=p_config.time_length,
+                fleet=self.fleet,
+                refresh_rate=c.refresh_rate,
+            )
+            self.registry.add(robot, c.groups)
+            robots.append(robot)
+        return robots
+
+    async def add_robots(self, robots_idx, server, robots=None):
+        """Add nodes of ``robots``, all registered robots by default."""
+        if robots is None:
+            robots = self.registry.robots
+        if self.robot_type is None:
+            self.robot_type = await address_space.add_robot_type(
+                server, robots_idx
+            )
+        added = await address_space.add_robots(
+            server, robots_idx, self.robot_type.nodeid, robots,
+            self.config.server.legacy_browse_names
+        )
+        for robot in robots:
+            server_robot = added[robot.label]
+            self.server_robots[robot.label] = server_robot
+            self.publisher.add(robot, server_robot)
+
+    def schedule(self, robots: list):
+        refresh_rate = self.config.server.refresh_rate
+        if refresh_rate is None:
+            refresh_rate = 10
+        for robot in robots:
+            period = robot.refresh_rate or refresh_rate
+            self.scheduler.add(robot.slot, period)
+            if self.lazy_updates:
+                self.lazy_updates.add(
+                    robot, self.server_robots[robot.label], period
+                )
+
+    async def remove_robots(self, labels: list[str]):
+        """Remove robots with ``labels`` and their nodes."""
+        robots = self.registry.remove(labels)
+        self.scheduler.remove([robot.slot for robot in robots])
+        nodes = []
+        for robot in robots:
+            if self.lazy_updates:
+                self.lazy_updates.remove(robot)
+            self.publisher.remove(robot)
+            self.fleet.remove(robot.slot)
+            nodes.append(self.server_robots.pop(robot.label))
+        await address_space.remove_robots(self.server, nodes)
+
+    async def reconfigure(self, config: Config):
+        """Apply robots and programs of ``config`` to the running server.
+
+        Only robots which were removed, added or whose config or program
+        changed have their nodes removed or added, changed ones start
+        over. Other robots keep running undisturbed. Changes of the server
+        part need a restart and are ignored. Raises ValueError for
+        configs which cannot be applied, before changing anything.
+        """
+        start = time.perf_counter()
+        if config.server != self.config.server:
+            self.log.warning(
+                "Changes of the server part need a restart, ignored."
+            )
+        config.validate()
+        old = _robot_programs(self.config)
+        new = _robot_programs(config)
+        removed = [label for label in old if new.get(label) != old[label]]
+        added = [
+            robot for label, (robot, program) in new.items()
+            if old.get(label) != (robot, program)
+        ]
+        # Load new programs first, a missing file leaves robots as they are
+        for robot in added:
+            programs.load_trajectory(new[robot.label][1].path)
+
+        await self.remove_robots(removed)
+        robots = self.create_robots(added, config.programs)
+        await self.add_robots(self.robots_idx, self.server, robots)
+        self.schedule(robots)
+        self.config = dataclasses.replace(config, server=self.config.server)
+        self.log.info(
+            f"Config reloaded, {len(removed)} robots removed and "
+            f"{len(robots)} added in {time.perf_counter() - start:.3f} "
+            f"seconds."
+        )
+
+    async def add_methods(self, robots_idx, server):
+        # Add method for stopping one and more robots
+        await server.nodes.objects.add_method(
+            ua.NodeId("stop_robot", robots_idx),
+            ua.QualifiedName("stop_robot", robots_idx),
+            uamethod(self.stop_robot),
+            [ua.VariantType.String],
+            [_string_array("stopped")],
+        )
+        # Add method for stopping all robots
+        await server.nodes.objects.add_method(
+            ua.NodeId("stop_all_robots", robots_idx),
+            ua.QualifiedName("stop_all_robots", robots_idx),
+            uamethod(self.stop_robots),
+            [ua.VariantType.Null],
+            [ua.VariantType.Int16],
+        )
+        # Add method for resuming one and more robots
+        await server.nodes.objects.add_method(
+            ua.NodeId("resume_robot", robots_idx),
+            ua.QualifiedName("resume_robot", robots_idx),
+            uamethod(self.resume_robot),
+            [ua.VariantType.String],
+            [_string_array("resumed")],
+        )
+        # Add method for resuming all robots
+        await server.nodes.objects.add_method(
+            ua.NodeId("resume_all_robots", robots_idx),
+            ua.QualifiedName("resume_all_robots", robots_idx),
+            uamethod(self.resume_robots),
+            [ua.VariantType.Null],
+            [ua.VariantType.Int16],
+        )
+        # Add method for getting real time pose
+        await server.nodes.objects.add_method(
+            ua.NodeId("realtime_pose", robots_idx),
+            ua.QualifiedName("realtime_pose", robots_idx),
+            uamethod(self.get_realtime_pose),
+            [ua.VariantType.String],
+            [ua.VariantType.String],
+        )
+        # Add method for listing all server robots
+        await server.nodes.objects.add_method(
+            ua.NodeId("list_robots", robots_idx),
+            ua.QualifiedName("list_robots", robots_idx),
+            uamethod(self.list_robots),
+            [ua.VariantType.Null],
+            [_string_array("robots")],
+        )
+
+    async def update(self, slots):
+        start = time.perf_counter()
+        if self.lazy_updates:
+            slots = self.lazy_updates.observed(slots)
+        written = 0
+        stepped = start
+        if slots.size:
+            self.fleet.step(time.time(), slots)
+            stepped = time.perf_counter()
+            written = await self.publisher.publish(self.server, slots)
+            if self.log.isEnabledFor(logging.DEBUG):
+                self.log.debug(
+                    f"Updated {slots.size} robots, published {written} "
+                    f"values.",
+                    extra={"robots": int(slots.size), "written": written},
+                )
+        self.metrics.observe_tick(
+            int(slots.size), written, start, stepped, time.perf_counter()
+        )
+
+    async def run(self):
+        config = self.config
+        # Set up user_manager and server
+        if config.server.security_policy:
+            cert_user_manager = CertificateUserManager()
+            admin_cert = Path(os.path.abspath(
+                f"{ROOT_FOLDER}/dobot_server/files/certificates/admin.crt"
+            ))
+            await cert_user_manager.add_user(admin_cert, name="admin")
+            server = Server(user_manager=cert_user_manager)
+        else:
+            server = Server()
+        self.server = server
+
+        await server.init()
+        server.set_endpoint(config.server.server_endpoint)
+        server.set_server_name(config.server.server_name)
+
+        # Set up namespace for log server
+        log_uri = config.server.log_server_url
+        log_idx = await server.register_namespace(log_uri)
+        # Set up namespace for robotic arms
+        robots_uri = config.server.robots_url
+        robots_idx = await server.register_namespace(robots_uri)
+        self.robots_idx = robots_idx
+
+        # Set server security
+        policy = get_security_policy(config.server.security_policy)
+
+        if policy:
+            server.set_security_policy(policy)
+            self.log.info(f"Server security policy set to: {policy}")
+            # Key generation blocks for a while, keep the event loop free
+            server_key, server_cert = await asyncio.get_running_loop() \
+                .run_in_executor(
+                    None, setup_server_certificate, config.server
+                )
+            # Load server certificate and private key
+            await server.load_certificate(str(server_cert))
+            await server.load_private_key(str(server_key))
+        else:
+            self.log.warning("None security policy has been set!")
+
+        # Create robots
+        self.create_robots(config.robots, config.programs)
+        # Add robots to server
+        await self.add_robots(robots_idx, server)
+        await self.add_methods(robots_idx, server)
+
+        self.log.info(f"Starting server {config.server.server_endpoint}!")
+
+        if config.server.lazy_updates:
+            self.lazy_updates = LazyUpdates(server, self.fleet)
+            self.log.info("Robot values are computed on demand.")
+        self.schedule(self.registry.robots)
+
+        await self.metrics.start(server, log_idx, self.scheduler)
+        metrics_server = None
+        if config.server.metrics_port is not None:
+            metrics_server = await self.metrics.serve(
+                config.server.metrics_address, config.server.metrics_port
+            )
+
+        capture = None
+        if config.server.capture_file:
+            capture = InteractionCapture(server, config.server.capture_file)
+            await capture.start(log_idx)
+
+        try:
+            async with server:
+                self.ready.set()
+                await self.scheduler.run(self.update)
+        finally:
+            self.metrics.stop()
+            if metrics_server:
+                metrics_server.close()
+            if capture:
+                await capture.stop()
+
+
+async def main(configs: Config | list[Config] | None = None,
+               flags=None,
+               offsets: dict[programs.Trajectory, int] | None = None,
+               config_file: str | None = None):
+    """Run servers of ``configs``, by default those of the config file.
+
+    Fleets of all servers address flags of programs in one concatenated
+    copy, ``flags`` at ``offsets`` when given. Changes of ``config_file``
+    are applied to running servers.
+    """
+    if configs is None:
+        configs = load_configs()
+    elif not isinstance(configs, list):
+        configs = [configs]
+    if flags is None:
+        flags, offsets = programs.share_trajectories([
+            path for config in configs for path in config.program_paths()
+        ])
+    personas = [Persona(config, flags, offsets) for config in configs]
+
+    profiler = Profiler()
+    profiler.install()
+    if PROFILE_ON_START:
+        profiler.start()
+
+    tasks = [persona.run() for persona in personas]
+    if config_file and CONFIG_POLL_INTERVAL > 0:
+        tasks.append(ConfigWatcher(config_file, load_configs, personas).run())
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        profiler.uninstall()
 
 
 def amain():
-    asyncio.run(main(), debug=True)
+    configs = load_configs()
+    listener = logs.setup_logging()
+    try:
+        if len(configs) == 1 and configs[0].server.workers > 1:
+            config = configs[0]
+            if config.server.security_policy:
+                # Workers share the certificate, generate it only once
+                setup_server_certificate(config.server)
+            sharding.Supervisor(config).run()
+        else:
+            if any(config.server.workers > 1 for config in configs):
+                _logger.warning(
+                    "Several servers run in one process, their workers "
+                    "setting is ignored."
+                )
+            asyncio.run(
+                main(configs, config_file=CONFIG_FILE), debug=ASYNCIO_DEBUG
+            )
+    finally:
+        listener.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,198 @@
+import asyncio
+import dataclasses
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from multiprocessing.connection import wait
+from urllib.parse import urlsplit, urlunsplit
+
+from dobot_server import logs
+from dobot_server.robot_simulation import programs
+from dobot_server.robot_simulation.shared import SharedSamples
+
+
+# Seconds before a worker which exited is started again
+RESTART_DELAY: float = float(os.environ.get("RESTART_DELAY", 5))
+# Seconds workers get to stop before they are killed
+STOP_TIMEOUT: float = 10
+
+_logger = logging.getLogger(__name__)
+
+
+def shard_endpoint(endpoint: str, index: int) -> str:
+    """Return ``endpoint`` with its port moved by ``index``."""
+    parts = urlsplit(endpoint)
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    port = (parts.port or 4840) + index
+    return urlunsplit(parts._replace(netloc=f"{host}:{port}"))
+
+
+def numbered(path: str, index: int) -> str:
+    root, extension = os.path.splitext(path)
+    return f"{root}.{index}{extension}"
+
+
+def split_robots(robots: list, workers: int) -> list[list]:
+    """Split ``robots`` into at most ``workers`` contiguous shards."""
+    size = -(-len(robots) // workers) if robots else 0
+    return [
+        robots[start:start + size]
+        for start in range(0, len(robots), size or 1)
+    ]
+
+
+def worker_config(config, index: int, robots: list):
+    """Return ``config`` of worker ``index`` serving ``robots``.
+
+    The worker listens on the endpoint port moved by ``index``, as do the
+    metrics endpoint, and writes its own capture file.
+    """
+    server = config.server
+    capture_file = server.capture_file
+    if capture_file:
+        capture_file = numbered(capture_file, index)
+    metrics_port = server.metrics_port
+    if metrics_port is not None:
+        metrics_port += index
+    server = dataclasses.replace(
+        server,
+        server_endpoint=shard_endpoint(server.server_endpoint, index),
+        capture_file=capture_file,
+        metrics_port=metrics_port,
+        renew_certificate=False,
+        workers=1,
+    )
+    return dataclasses.replace(config, server=server, robots=robots)
+
+
+def _stop_with_parent():
+    # A killed supervisor cannot stop its workers, they stop themselves
+    wait([multiprocessing.parent_process().sentinel])
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def run_worker(config, index: int, spec: dict):
+    """Serve one shard, entry point of worker processes."""
+    # Only the supervisor reacts to Ctrl+C, it stops workers by SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    threading.Thread(target=_stop_with_parent, daemon=True).start()
+    listener = logs.setup_logging(numbered(logs.LOG_FILE, index))
+    from dobot_server import server
+
+    try:
+        shared = SharedSamples.attach(spec)
+        for trajectory in shared.trajectories():
+            programs.register_trajectory(trajectory)
+        asyncio.run(
+            server.main(config, shared.flags, shared.offsets),
+            debug=server.ASYNCIO_DEBUG,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        listener.stop()
+
+
+class Supervisor:
+    """Serves robots of ``config`` by several worker processes.
+
+    Robots are split into ``workers`` contiguous shards, worker ``i``
+    serves its shard on the configured endpoint port plus ``i``. Program
+    trajectories are parsed once into shared memory, which all workers
+    map read-only instead of loading their own copies. Workers which exit
+    are started again after ``RESTART_DELAY``. Stop the supervisor by
+    SIGINT or SIGTERM, it stops its workers.
+    """
+
+    def __init__(self, config, workers: int | None = None):
+        self.config = config
+        shards = split_robots(config.robots, workers or config.server.workers)
+        self.shards = [
+            worker_config(config, index, robots)
+            for index, robots in enumerate(shards)
+        ]
+        self.processes = {}
+        self.shared = None
+        self._context = multiprocessing.get_context("spawn")
+
+    def share_programs(self):
+        trajectories = {}
+        for path in self.config.program_paths():
+            path = os.path.abspath(path)
+            if path not in trajectories:
+                trajectories[path] = programs.read_trajectory(path)
+        self.shared = SharedSamples.create(list(trajectories.values()))
+        _logger.info(
+            f"Shared {len(trajectories)} programs, "
+            f"{self.shared.memory.size} bytes."
+        )
+
+    def start_worker(self, index: int):
+        shard = self.shards[index]
+        process = self._context.Process(
+            target=run_worker,
+            args=(shard, index, self.shared.spec),
+            name=f"dobot-worker-{index}",
+        )
+        process.start()
+        self.processes[index] = process
+        _logger.info(
+            f"Worker {index} (pid {process.pid}) serves "
+            f"{len(shard.robots)} robots on {shard.server.server_endpoint}."
+        )
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        self.share_programs()
+        try:
+            for index in range(len(self.shards)):
+                self.start_worker(index)
+            while True:
+                workers = {
+                    process.sentinel: index
+                    for index, process in self.processes.items()
+                }
+                exited = [workers[sentinel] for sentinel in wait(workers)]
+                for index in exited:
+                    process = self.processes[index]
+                    process.join()
+                    _logger.error(
+                        f"Worker {index} exited with code "
+                        f"{process.exitcode}, starting it again in "
+                        f"{RESTART_DELAY} seconds."
+                    )
+                time.sleep(RESTART_DELAY)
+                for index in exited:
+                    self.start_worker(index)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        # Repeated signals must not interrupt stopping workers
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for index, process in self.processes.items():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                _logger.warning(f"Worker {index} did not stop, killing it.")
+                process.kill()
+                process.join()
+        self.processes = {}
+        if self.shared:
+            self.shared.close()
+            self.shared.unlink()
+            self.shared = None
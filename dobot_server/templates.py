@@ -0,0 +1,109 @@
+from typing import Iterable, Iterator
+
+
+# Fields of templates formatted for every generated robot
+PATTERN_FIELDS = ("label", "serial_number", "name")
+
+
+def _format(pattern, position: int, n: int, index: int) -> str:
+    try:
+        return str(pattern).format(n=n, index=index)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(
+            f"Robot template {position} has invalid pattern "
+            f"{pattern!r}: {e!r}"
+        ) from None
+
+
+def assign_programs(program, count: int, position: int = 0) -> Iterator:
+    """Yield programs of ``count`` robots generated by a template.
+
+    ``program`` is one program run by all robots, a list of programs
+    assigned round-robin or a mapping of programs to their weights. Weights
+    are spread evenly, ``{1: 3, 2: 1}`` gives 1, 1, 2, 1, 1, 1, 2, 1 and
+    so on, so the same template always assigns the same programs.
+    """
+    if isinstance(program, list):
+        if not program:
+            raise ValueError(f"Robot template {position} has no programs")
+        for index in range(count):
+            yield program[index % len(program)]
+    elif isinstance(program, dict):
+        if not program or any(
+            not isinstance(weight, (int, float)) or weight <= 0
+            for weight in program.values()
+        ):
+            raise ValueError(
+                f"Robot template {position} needs positive program weights"
+            )
+        total = sum(program.values())
+        current = dict.fromkeys(program, 0)
+        for _ in range(count):
+            for key, weight in program.items():
+                current[key] += weight
+            chosen = max(current, key=current.get)
+            current[chosen] -= total
+            yield chosen
+    else:
+        for _ in range(count):
+            yield program
+
+
+def expand_template(template: dict, position: int = 0) -> Iterator[dict]:
+    """Yield robots generated by ``template``, a robot with ``count``.
+
+    Robots are numbered by ``n`` from ``start``, 1 by default, and by
+    ``index`` from 0. Label, serial number and name are patterns of these
+    numbers, ``"robot_{n}"`` or ``"A{n:010d}B"`` for example, as are
+    group names. An integer ``id`` is the id of the first robot and grows
+    by one, a string ``id`` is a pattern.
+    """
+    template = dict(template)
+    count = template.pop("count")
+    start = template.pop("start", 1)
+    if not isinstance(count, int) or count < 0:
+        raise ValueError(
+            f"Robot template {position} needs a non-negative count"
+        )
+    if not isinstance(start, int):
+        raise ValueError(f"Robot template {position} needs integer start")
+    if "program" not in template:
+        raise ValueError(f"Robot template {position} has no program")
+    assigned = assign_programs(template.pop("program"), count, position)
+    robot_id = template.pop("id", None)
+    groups = template.pop("groups", [])
+    for index, program in enumerate(assigned):
+        n = start + index
+        robot = dict(template, program=program)
+        for field in PATTERN_FIELDS:
+            if field in robot:
+                robot[field] = _format(robot[field], position, n, index)
+        if isinstance(robot_id, str):
+            try:
+                robot["id"] = int(_format(robot_id, position, n, index))
+            except ValueError:
+                raise ValueError(
+                    f"Robot template {position} id pattern {robot_id!r} "
+                    f"does not give a number"
+                ) from None
+        elif robot_id is not None:
+            robot["id"] = robot_id + index
+        robot["groups"] = [
+            _format(group, position, n, index) for group in groups
+        ]
+        yield robot
+
+
+def expand_robots(items: Iterable[dict]) -> Iterator[dict]:
+    """Yield robots of the ``robots`` config part, templates expanded.
+
+    Robots are generated one at a time, so a template of thousands of
+    robots never exists as a list of dictionaries.
+    """
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"Robot {position} is not a mapping")
+        if "count" in item:
+            yield from expand_template(item, position)
+        else:
+            yield item
@@ -4,8 +4,8 @@ import os
 EFFECTOR_STATUS: str = str(os.environ.get("EFFECTOR_STATUS", False))
 
 
-def get_effector(effector: bool) -> list:
+def get_effector(effector: bool, effector_status=EFFECTOR_STATUS) -> list:
     if effector:
-        return [effector, EFFECTOR_STATUS]
+        return [effector, effector_status]
     else:
         return [effector]
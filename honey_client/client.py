@@ -1,7 +1,12 @@
-import ast
+import argparse
 import asyncio
+import functools
+import json
 import os
+import re
 import sys
+import time
+from datetime import datetime, timezone
 
 import yaml
 
@@ -9,77 +14,209 @@ from asyncua import Client, ua
 
 
 config_file = "dobot_server/files/config.yaml"
+# Publishing interval of live monitoring subscription in milliseconds
+LIVE_PERIOD = 500
+# Seconds between notification statistics of live monitoring
+LIVE_STATS_PERIOD = 5
+# Seconds before reconnecting, doubled after every failed attempt
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 30
+# Servers batch mode talks to at the same time
+MAX_CONNECTIONS = 16
+# Connection attempts to each server in batch mode
+BATCH_ATTEMPTS = 3
 
 
 def load_config(config_path):
-    print(config_path)
+    print(config_path, file=sys.stderr)
     with open(config_path, "r") as config:
         config = yaml.full_load(config)
         return config["server"]
 
 
-async def get_values(client, robots_idx, robot):
-    identifier = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:id_{robot}"
-    )
-    identifier = await identifier.read_value()
-    sn = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:sn_{robot}"
-    )
-    sn = await sn.read_value()
-    name = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:name_{robot}"
-    )
-    name = await name.read_value()
-    version = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:version_{robot}"
-    )
-    version = await version.read_value()
-    program = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:program_{robot}"
-    )
-    program = await program.read_value()
-    pose = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:pose_{robot}"
-    )
-    pose = await pose.read_value()
-    alarm = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:alarm_{robot}"
-    )
-    alarm = await alarm.read_value()
-    home = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:home_position_{robot}"
-    )
-    home = await home.read_value()
-    status = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:work_status_{robot}"
-    )
-    status = await status.read_value()
-    laser = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:laser_{robot}"
-    )
-    laser = await laser.read_value()
-    suction_cup = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:suction_cup_{robot}"
-    )
-    suction_cup = await suction_cup.read_value()
-    gripper = await client.nodes.root.get_child(
-        f"0:Objects/{robots_idx}:{robot}/{robots_idx}:gripper_{robot}"
-    )
-    gripper = await gripper.read_value()
-
-    print(f"id:             {identifier}\n"
-          f"sn:             {sn}\n"
-          f"name:           {name}\n"
-          f"version:        {version}\n"
-          f"program:        {program}\n"
-          f"pose:           {pose}\n"
-          f"alarm:          {alarm}\n"
-          f"home:           {home}\n"
-          f"status:         {status}\n"
-          f"laser:          {laser}\n"
-          f"suction_cup:    {suction_cup}\n"
-          f"gripper:        {gripper}\n")
+# Robot labels in commands are separated by commas or spaces
+SEPARATORS = re.compile(r"[,\s]+")
+
+
+# Robot variables shown by the client with their printed names
+FIELDS = {
+    "id": "id",
+    "sn": "sn",
+    "name": "name",
+    "version": "version",
+    "program": "program",
+    "pose": "pose",
+    "alarm": "alarm",
+    "home_position": "home",
+    "work_status": "status",
+    "laser": "laser",
+    "suction_cup": "suction_cup",
+    "gripper": "gripper",
+}
+
+
+class RobotNodes:
+    """Nodes of robot variables, resolved once per client session.
+
+    Browse paths of all unknown robots are translated in one request, so
+    showing any number of robots costs one translate and one read request
+    the first time and a single read request afterwards.
+    """
+
+    def __init__(self, client, robots_idx):
+        self.client = client
+        self.robots_idx = robots_idx
+        self.nodes = {}
+
+    def _browse_path(self, robot, field):
+        path = ua.BrowsePath()
+        path.StartingNode = ua.NodeId(ua.ObjectIds.ObjectsFolder)
+        # Children named as in DobotArmType, legacy aliases are optional
+        for name in (robot, field):
+            element = ua.RelativePathElement()
+            element.ReferenceTypeId = ua.NodeId(
+                ua.ObjectIds.HierarchicalReferences
+            )
+            element.IsInverse = False
+            element.IncludeSubtypes = True
+            element.TargetName = ua.QualifiedName(name, self.robots_idx)
+            path.RelativePath.Elements.append(element)
+        return path
+
+    async def resolve(self, robots):
+        missing = [robot for robot in robots if robot not in self.nodes]
+        paths = [
+            self._browse_path(robot, field)
+            for robot in missing for field in FIELDS
+        ]
+        if paths:
+            results = iter(
+                await self.client.uaclient.translate_browsepaths_to_nodeids(
+                    paths
+                )
+            )
+            for robot in missing:
+                nodes = []
+                for _ in FIELDS:
+                    result = next(results)
+                    result.StatusCode.check()
+                    nodes.append(
+                        self.client.get_node(result.Targets[0].TargetId)
+                    )
+                self.nodes[robot] = nodes
+        return [self.nodes[robot] for robot in robots]
+
+    async def read(self, robots):
+        """Return values of ``robots`` by field, read in one request."""
+        nodes = await self.resolve(robots)
+        values = await self.client.read_values(
+            [node for robot_nodes in nodes for node in robot_nodes]
+        )
+        return [
+            dict(zip(FIELDS, values[i:i + len(FIELDS)]))
+            for i in range(0, len(values), len(FIELDS))
+        ]
+
+
+def print_values(values):
+    print("".join(
+        f"{f'{FIELDS[field]}:':<16}{value}\n"
+        for field, value in values.items()
+    ))
+
+
+async def show_robot(connection, robot):
+    [values] = await connection.robot_nodes.read([robot])
+    print_values(values)
+
+
+async def show_all_robots(connection):
+    robots = await connection.call("list_robots")
+    values = await connection.robot_nodes.read(robots)
+    for robot, robot_values in zip(robots, values):
+        print(robot)
+        print_values(robot_values)
+
+
+# Robot variables watched by live monitoring
+LIVE_FIELDS = ["pose", "alarm", "work_status"]
+
+
+class LiveMonitor:
+    """Prints data changes of monitored robot variables as they arrive.
+
+    Keeps count of notifications and their latency, measured from the
+    server timestamp of the value until it reaches the client.
+    """
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.notifications = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.started = time.monotonic()
+
+    def datachange_notification(self, node, value, data):
+        robot, field = self.labels[node.nodeid]
+        print(f"{robot:<16}{FIELDS[field]:<16}{value}")
+        timestamp = data.monitored_item.Value.ServerTimestamp
+        if timestamp is None:
+            timestamp = data.monitored_item.Value.SourceTimestamp
+        if timestamp is None:
+            return
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        latency = (datetime.now(timezone.utc) - timestamp).total_seconds()
+        self.notifications += 1
+        self.latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def print_stats(self):
+        elapsed = time.monotonic() - self.started
+        if self.notifications:
+            print(
+                f"{self.notifications / elapsed:.1f} notifications/s, "
+                f"latency {1000 * self.latency / self.notifications:.1f} ms "
+                f"average, {1000 * self.max_latency:.1f} ms max"
+            )
+        self.notifications = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.started = time.monotonic()
+
+
+async def print_live_stats(monitor):
+    while True:
+        await asyncio.sleep(LIVE_STATS_PERIOD)
+        monitor.print_stats()
+
+
+async def monitor_robots(connection):
+    """Watch pose, alarm and work status of all robots until Enter is
+    pressed, using one subscription.
+    """
+    client = connection.client
+    robots = await connection.call("list_robots")
+    labels = {}
+    robot_nodes = await connection.robot_nodes.resolve(robots)
+    for robot, nodes in zip(robots, robot_nodes):
+        nodes = dict(zip(FIELDS, nodes))
+        for field in LIVE_FIELDS:
+            labels[nodes[field].nodeid] = (robot, field)
+
+    monitor = LiveMonitor(labels)
+    subscription = await client.create_subscription(LIVE_PERIOD, monitor)
+    stats = asyncio.create_task(print_live_stats(monitor))
+    try:
+        await subscription.subscribe_data_change(
+            [client.get_node(nodeid) for nodeid in labels]
+        )
+        # Waiting for Enter in a thread keeps notifications coming
+        await asyncio.to_thread(input, "Press Enter to stop monitoring.\n")
+    finally:
+        stats.cancel()
+        await subscription.delete()
+    monitor.print_stats()
 
 
 def get_security_policy(policy_names: list) -> ...:
@@ -112,6 +249,87 @@ def get_security_policy(policy_names: list) -> ...:
         return policy
 
 
+class Connection:
+    """Client session to the server reused by all commands.
+
+    The session is kept alive by the client watchdog while the menu waits
+    for input. A lost connection is opened again with exponentially
+    growing delays between attempts, up to ``attempts`` times if given,
+    namespace index and robot nodes are resolved once and reused by the
+    new session. Progress messages are passed to ``log``.
+    """
+
+    def __init__(self, server_url, robots_url, attempts=None, log=print):
+        self.server_url = server_url
+        self.robots_url = robots_url
+        self.attempts = attempts
+        self.log = log
+        self.client = None
+        self.robots_idx = None
+        self.robot_nodes = None
+
+    async def connect(self):
+        self.log(f"Connection to {self.server_url} ...")
+        delay = RECONNECT_DELAY
+        attempt = 1
+        while True:
+            client = Client(self.server_url)
+            try:
+                await client.connect()
+                break
+            except (OSError, asyncio.TimeoutError, ua.UaError) as e:
+                if attempt == self.attempts:
+                    raise
+                self.log(
+                    f"Connection failed: {e}, retrying in {delay} s ..."
+                )
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, MAX_RECONNECT_DELAY)
+                attempt += 1
+        self.client = client
+
+        if self.robots_idx is None:
+            self.robots_idx = await client.get_namespace_index(
+                self.robots_url
+            )
+            self.log(f"Namespace index to '{self.robots_url}': "
+                     f"{self.robots_idx}")
+            self.robot_nodes = RobotNodes(client, self.robots_idx)
+        else:
+            self.robot_nodes.client = client
+
+    async def disconnect(self):
+        try:
+            await self.client.disconnect()
+        except Exception:
+            # The connection is already gone, nothing to close
+            pass
+
+    async def reconnect(self):
+        self.log("Connection closed, trying reconnect...")
+        await self.disconnect()
+        await self.connect()
+
+    async def call(self, method, *args):
+        return await self.client.nodes.objects.call_method(
+            f"{self.robots_idx}:{method}", *args
+        )
+
+    async def run(self, command):
+        """Run ``command`` with this connection, when the connection is
+        lost reconnect and run it once more.
+        """
+        try:
+            await self.client.check_connection()
+        except Exception:
+            await self.reconnect()
+        try:
+            return await command(self)
+        except ConnectionError:
+            await self.reconnect()
+            return await command(self)
+
+
 def print_menu():
     print(" ____________________________________________________\n"
           "|                                                    |\n"
@@ -121,179 +339,245 @@ def print_menu():
           "|    04   Stop all robots                            |\n"                         
           "|    05   Resume robot(s)                            |\n"
           "|    06   Resume all robots                          |\n"
+          "|    07   Show status of all robots                  |\n"
+          "|    08   Live monitoring of all robots              |\n"
           "|    00   Exit                                       |\n"       
           "|____________________________________________________|\n")
 
 
+async def show_robots(connection):
+    for robot in await connection.call("list_robots"):
+        print(robot)
+
+
+async def change_robots(connection, method, label, action):
+    result = await connection.call(method, f"{label}")
+    if len(result) == 0:
+        print(f"No robot was {action}.")
+        return
+    print(f"{action.capitalize()} robots:")
+    for robot in result:
+        print(robot)
+
+
+async def change_all_robots(connection, method, message):
+    result = await connection.call(method)
+    if result != 0:
+        print("Something went wrong.")
+        return
+    print(message)
+
+
+async def list_robots(connection, argument):
+    return await connection.call("list_robots")
+
+
+async def robots_status(connection, argument):
+    labels = SEPARATORS.split(argument.strip()) if argument else ["*"]
+    if labels == ["*"]:
+        labels = await connection.call("list_robots")
+    values = await connection.robot_nodes.read(labels)
+    return dict(zip(labels, values))
+
+
+async def realtime_pose(connection, argument):
+    return await connection.call("realtime_pose", argument)
+
+
+# Commands of batch mode, each called with the connection and the rest of
+# the command line as its argument
+BATCH_COMMANDS = {
+    "list": list_robots,
+    "status": robots_status,
+    "pose": realtime_pose,
+    "stop": lambda c, argument: c.call("stop_robot", argument),
+    "stop_all": lambda c, argument: c.call("stop_all_robots"),
+    "resume": lambda c, argument: c.call("resume_robot", argument),
+    "resume_all": lambda c, argument: c.call("resume_all_robots"),
+}
+
+
+def emit(record):
+    print(json.dumps(record, default=str), flush=True)
+
+
+async def run_batch(server_url, robots_url, commands, pool):
+    """Run ``commands`` one by one on the server, emitting a JSON line
+    with the result or error of each.
+    """
+    async with pool:
+        connection = Connection(
+            server_url, robots_url, attempts=BATCH_ATTEMPTS,
+            log=functools.partial(print, file=sys.stderr)
+        )
+        try:
+            await connection.connect()
+        except Exception as e:
+            emit({"endpoint": server_url, "command": None, "error": f"{e}"})
+            return
+        try:
+            for command in commands:
+                record = {"endpoint": server_url, "command": command}
+                name, _, argument = command.strip().partition(" ")
+                start = time.perf_counter()
+                try:
+                    if name not in BATCH_COMMANDS:
+                        raise ValueError(f"Unknown command {name}")
+                    record["result"] = await connection.run(
+                        functools.partial(
+                            BATCH_COMMANDS[name], argument=argument
+                        )
+                    )
+                except Exception as e:
+                    record["error"] = f"{e}"
+                record["seconds"] = round(time.perf_counter() - start, 6)
+                emit(record)
+        finally:
+            await connection.disconnect()
+
+
+async def batch(endpoints, robots_url, commands, max_connections):
+    """Run ``commands`` on all ``endpoints`` concurrently, talking to at
+    most ``max_connections`` servers at once.
+    """
+    pool = asyncio.Semaphore(max_connections)
+    await asyncio.gather(*(
+        run_batch(endpoint, robots_url, commands, pool)
+        for endpoint in endpoints
+    ))
+
+
+def read_lines(path):
+    with (sys.stdin if path == "-" else open(path)) as lines:
+        return [line.strip() for line in lines if line.strip()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Client of the Dobot honeypot server. Without "
+                    "commands an interactive menu is shown, with them the "
+                    "commands are run on all endpoints and results are "
+                    "printed as JSON lines."
+    )
+    parser.add_argument(
+        "-c", "--command", action="append", default=[],
+        help=f"command to run, one of {', '.join(BATCH_COMMANDS)} "
+             "followed by its argument, can be repeated"
+    )
+    parser.add_argument(
+        "--commands-file", help="file with one command per line, - for stdin"
+    )
+    parser.add_argument(
+        "-e", "--endpoint", action="append", default=[],
+        help="server endpoint, can be repeated, default from config"
+    )
+    parser.add_argument(
+        "--endpoints-file", help="file with one server endpoint per line"
+    )
+    parser.add_argument(
+        "--robots-url", help="robots namespace uri, default from config"
+    )
+    parser.add_argument(
+        "--max-connections", type=int, default=MAX_CONNECTIONS,
+        help="servers connected at the same time"
+    )
+    return parser.parse_args()
+
+
 async def main():
-    config_path = f"{os.path.abspath("../")}/{config_file}"
-    config = load_config(config_path)
-    # server_address = config["server_address"]
-    server_url = config["server_endpoint"]
-    robots_url = config["robots_url"]
+    args = parse_args()
+    commands = args.command
+    if args.commands_file:
+        commands += read_lines(args.commands_file)
+    endpoints = args.endpoint
+    if args.endpoints_file:
+        endpoints += read_lines(args.endpoints_file)
 
-    print(f"Connection to {server_url} ...")
+    server_url = robots_url = None
+    if not endpoints or not args.robots_url:
+        config_path = f"{os.path.abspath('../')}/{config_file}"
+        config = load_config(config_path)
+        # server_address = config["server_address"]
+        server_url = config["server_endpoint"]
+        robots_url = config["robots_url"]
+    robots_url = args.robots_url or robots_url
 
-    client = Client(server_url)
-    await client.connect()
+    if commands:
+        await batch(
+            endpoints or [server_url], robots_url, commands,
+            args.max_connections
+        )
+        return
 
-    robots_idx = await client.get_namespace_index(robots_url)
-    print(f"Namespace index to '{robots_url}': {robots_idx}")
+    connection = Connection(endpoints[0] if endpoints else server_url,
+                            robots_url)
+    await connection.connect()
 
     while True:
         print_menu()
-        option = input("Enter your option: ")
+        # Input is read in a thread, the event loop keeps the session alive
+        option = await asyncio.to_thread(input, "Enter your option: ")
 
         try:
             option = int(option)
         except ValueError:
             print("\nWrong value! Please insert a number of desired option.")
         match option:
-
             case 1:
-                try:
-                    result = await client.nodes.objects.call_method(
-                        f"{robots_idx}:list_robots"
-                    )
-                    result = ast.literal_eval(result)
-                    for robot in result:
-                        print(robot)
-                except (ConnectionError, ua.UaError):
-                    print("Connection closed, trying reconnect...")
-                    client = Client(server_url)
-                    await client.connect()
-                    continue
-                except (RuntimeError, ua.UaError):
-                    print("Request timeout")
-                    continue
-                except Exception as e:
-                    print(f"Something went wrong: {e}")
-                    continue
-                continue
-
+                command = show_robots
             case 2:
-                robot = input("Enter robot label: ")
-                try:
-                    await get_values(client, robots_idx, robot)
-                except ua.uaerrors.BadNoMatch:
-                    print("Choose existing robot please.")
-                    continue
-                except (ConnectionError, ua.UaError):
-                    print("Connection closed, trying reconnect...")
-                    client = Client(server_url)
-                    await client.connect()
-                    continue
-                except (RuntimeError, ua.UaError):
-                    print("Request timeout")
-                    continue
-                except Exception as e:
-                    print(f"Something went wrong: {e}")
-                    continue
-                continue
-
+                robot = await asyncio.to_thread(input, "Enter robot label: ")
+                command = functools.partial(show_robot, robot=robot)
             case 3:
-                label = input("Enter the labels of robots you want to stop: ")
-                try:
-                    result = await client.nodes.objects.call_method(
-                        f"{robots_idx}:stop_robot", f"{label}"
-                    )
-                    result = ast.literal_eval(result)
-                    if len(result) == 0:
-                        print("No robot was stopped.")
-                        continue
-                    print("Stopped robots:")
-                    for robot in result:
-                        print(robot)
-                except (ConnectionError, ua.UaError):
-                    print("Connection closed, trying reconnect...")
-                    client = Client(server_url)
-                    await client.connect()
-                    continue
-                except (RuntimeError, ua.UaError):
-                    print("Request timeout")
-                    continue
-                except Exception as e:
-                    print(f"Something went wrong: {e}")
-                    continue
-                continue
-
+                label = await asyncio.to_thread(
+                    input,
+                    "Enter the labels or selectors of robots you want to "
+                    "stop: "
+                )
+                command = functools.partial(
+                    change_robots, method="stop_robot", label=label,
+                    action="stopped"
+                )
             case 4:
-                try:
-                    result = await client.nodes.objects.call_method(
-                        f"{robots_idx}:stop_all_robots"
-                    )
-                    if result != 0:
-                        print("Something went wrong.")
-                        continue
-                    print("All robots are stopped.")
-                except (ConnectionError, ua.UaError):
-                    print("Connection closed, trying reconnect...")
-                    client = Client(server_url)
-                    await client.connect()
-                    continue
-                except (RuntimeError, ua.UaError):
-                    print("Request timeout")
-                    continue
-                except Exception as e:
-                    print(f"Something went wrong: {e}")
-                    continue
-                continue
-
+                command = functools.partial(
+                    change_all_robots, method="stop_all_robots",
+                    message="All robots are stopped."
+                )
             case 5:
-                label = input("Enter the labels of robots you want to resume: ")
-                try:
-                    result = await client.nodes.objects.call_method(
-                        f"{robots_idx}:resume_robot", f"{label}"
-                    )
-                    result = ast.literal_eval(result)
-                    if len(result) == 0:
-                        print("No robot was resumed.")
-                        continue
-                    print("Resumed robots:")
-                    for robot in result:
-                        print(robot)
-                except (ConnectionError, ua.UaError):
-                    print("Connection closed, trying reconnect...")
-                    client = Client(server_url)
-                    await client.connect()
-                    continue
-                except (RuntimeError, ua.UaError):
-                    print("Request timeout")
-                    continue
-                except Exception as e:
-                    print(f"Something went wrong: {e}")
-                    continue
-                continue
-
+                label = await asyncio.to_thread(
+                    input,
+                    "Enter the labels or selectors of robots you want to "
+                    "resume: "
+                )
+                command = functools.partial(
+                    change_robots, method="resume_robot", label=label,
+                    action="resumed"
+                )
             case 6:
-                try:
-                    result = await client.nodes.objects.call_method(
-                        f"{robots_idx}:resume_all_robots"
-                    )
-                    if result != 0:
-                        print("Something went wrong.")
-                        continue
-                    print("Robots were resumed.")
-                except (ConnectionError, ua.UaError):
-                    print("Connection closed, trying reconnect...")
-                    client = Client(server_url)
-                    await client.connect()
-                    continue
-                except (RuntimeError, ua.UaError):
-                    print("Request timeout")
-                    continue
-                except Exception as e:
-                    print(f"Something went wrong: {e}")
-
-                    continue
-                continue
-
+                command = functools.partial(
+                    change_all_robots, method="resume_all_robots",
+                    message="Robots were resumed."
+                )
+            case 7:
+                command = show_all_robots
+            case 8:
+                command = monitor_robots
             case 0:
+                await connection.disconnect()
                 sys.exit(0)
             case _:
                 print("\nChose one of the options below:")
                 continue
 
+        try:
+            await connection.run(command)
+        except ua.uaerrors.BadNoMatch:
+            print("Choose existing robot please.")
+        except (asyncio.TimeoutError, RuntimeError):
+            print("Request timeout")
+        except Exception as e:
+            print(f"Something went wrong: {e}")
+
 
 if __name__ == "__main__":
     asyncio.run(main())
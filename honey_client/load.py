@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+from asyncua import Client, ua
+
+from honey_client.client import (
+    FIELDS, MAX_RECONNECT_DELAY, RECONNECT_DELAY, RobotNodes
+)
+
+
+# Default weights of operations each session picks from
+MIX = "read=6,call=3,subscribe=1"
+# Robot variables read by read operations
+READ_FIELDS = ["pose", "alarm", "work_status"]
+READ_INDEXES = [list(FIELDS).index(field) for field in READ_FIELDS]
+# Methods called by call operations and whether they take a robot label
+METHODS = {
+    "list_robots": False,
+    "realtime_pose": True,
+    "stop_robot": True,
+    "resume_robot": True,
+}
+# Seconds between samples of the server tick lag
+LAG_PERIOD = 0.5
+# Seconds before an operation is given up, requests of a connection lost
+# without notice are never answered
+OPERATION_TIMEOUT = 10
+
+
+class Stats:
+    """Latencies and errors of operations of all sessions."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.notifications = 0
+
+    def add(self, operation, latency):
+        self.latencies.setdefault(operation, []).append(latency)
+
+    def error(self, operation, error):
+        self.errors.setdefault(operation, {})
+        name = type(error).__name__
+        self.errors[operation][name] = self.errors[operation].get(name, 0) + 1
+
+    def report(self, duration):
+        print(f"{'operation':<12}{'count':>9}{'ops/s':>10}"
+              f"{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies.get(operation, []))
+            errors = sum(self.errors.get(operation, {}).values())
+            if len(latencies) > 1:
+                percentiles = statistics.quantiles(
+                    latencies, n=100, method="inclusive"
+                )
+                p50, p99 = percentiles[49], percentiles[98]
+            else:
+                p50 = p99 = latencies[0] if latencies else float("nan")
+            print(f"{operation:<12}{len(latencies):>9}"
+                  f"{len(latencies) / duration:>10.1f}"
+                  f"{1000 * p50:>10.2f}{1000 * p99:>10.2f}{errors:>8}")
+        for operation, errors in self.errors.items():
+            print(f"{operation} errors: {errors}")
+        print(f"subscription notifications: {self.notifications}")
+
+
+class Notifications:
+    """Subscription handler signalling the first data change."""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.received = asyncio.Event()
+
+    def datachange_notification(self, node, value, data):
+        self.stats.notifications += 1
+        self.received.set()
+
+
+async def read(client, robot_nodes, robots, stats):
+    [nodes] = await robot_nodes.resolve([random.choice(robots)])
+    await client.read_values([nodes[i] for i in READ_INDEXES])
+
+
+async def call(client, robot_nodes, robots, stats):
+    method = random.choice(list(METHODS))
+    args = [random.choice(robots)] if METHODS[method] else []
+    await client.nodes.objects.call_method(
+        f"{robot_nodes.robots_idx}:{method}", *args
+    )
+
+
+async def subscribe(client, robot_nodes, robots, stats):
+    # Measures the time until the first notification of a new subscription
+    [nodes] = await robot_nodes.resolve([random.choice(robots)])
+    handler = Notifications(stats)
+    subscription = await client.create_subscription(100, handler)
+    try:
+        await subscription.subscribe_data_change(
+            [nodes[i] for i in READ_INDEXES]
+        )
+        await handler.received.wait()
+    finally:
+        await subscription.delete()
+
+
+OPERATIONS = {"read": read, "call": call, "subscribe": subscribe}
+
+
+async def operate(client, robots_url, mix, deadline, think_time, timeout,
+                  stats):
+    """Run random operations until ``deadline``.
+
+    Raises ConnectionError or TimeoutError, counted as errors already,
+    when the connection is lost.
+    """
+    operations = list(mix)
+    weights = list(mix.values())
+    try:
+        robots_idx = await client.get_namespace_index(robots_url)
+        robot_nodes = RobotNodes(client, robots_idx)
+        robots = await client.nodes.objects.call_method(
+            f"{robots_idx}:list_robots"
+        )
+        await robot_nodes.resolve(robots)
+    except Exception as e:
+        stats.error("connect", e)
+        raise
+    while time.monotonic() < deadline:
+        operation = random.choices(operations, weights)[0]
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                OPERATIONS[operation](client, robot_nodes, robots, stats),
+                timeout,
+            )
+        except Exception as e:
+            # Clients wait for failed operations too, they count in latency
+            stats.add(operation, time.perf_counter() - start)
+            stats.error(operation, e)
+            if isinstance(e, (ConnectionError, asyncio.TimeoutError)):
+                raise
+        else:
+            stats.add(operation, time.perf_counter() - start)
+        if think_time:
+            await asyncio.sleep(random.expovariate(1 / think_time))
+
+
+async def session(endpoint, robots_url, mix, deadline, think_time, timeout,
+                  stats):
+    """Keep one client session busy until ``deadline``.
+
+    A session which fails to connect or loses its connection connects
+    again, after delays growing exponentially while attempts fail. Failed
+    attempts are counted as errors of the ``connect`` operation.
+    """
+    delay = RECONNECT_DELAY
+    while time.monotonic() < deadline:
+        client = Client(endpoint, timeout)
+        try:
+            await client.connect()
+        except Exception as e:
+            stats.error("connect", e)
+        else:
+            delay = RECONNECT_DELAY
+            try:
+                await operate(
+                    client, robots_url, mix, deadline, think_time, timeout,
+                    stats
+                )
+            except Exception:
+                # Counted by operate, connect again
+                pass
+            finally:
+                try:
+                    await asyncio.wait_for(client.disconnect(), timeout)
+                except Exception:
+                    # The connection is already gone, nothing to close
+                    pass
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(2 * delay, MAX_RECONNECT_DELAY)
+
+
+async def watch_lag(endpoint, log_url, deadline):
+    """Sample tick lag of the server, return the samples."""
+    samples = []
+    async with Client(endpoint) as client:
+        log_idx = await client.get_namespace_index(log_url)
+        node = await client.nodes.objects.get_child(
+            [f"{log_idx}:simulation", f"{log_idx}:tick_lag"]
+        )
+        while time.monotonic() < deadline:
+            samples.append(await node.read_value())
+            await asyncio.sleep(LAG_PERIOD)
+    return samples
+
+
+async def run(args):
+    mix = {}
+    for item in args.mix.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {operation}")
+        mix[operation] = float(weight or 1)
+
+    stats = Stats()
+    start = time.monotonic()
+    deadline = start + args.duration
+    lag = asyncio.create_task(watch_lag(args.endpoint, args.log_url, deadline))
+    results = await asyncio.gather(
+        *(
+            session(args.endpoint, args.robots_url, mix, deadline,
+                    args.think_time, args.timeout, stats)
+            for _ in range(args.sessions)
+        ),
+        return_exceptions=True,
+    )
+    duration = time.monotonic() - start
+    failed = [result for result in results if isinstance(result, Exception)]
+
+    print(f"{args.sessions} sessions, {duration:.1f} s, "
+          f"{len(failed)} sessions failed")
+    for error in failed[:5]:
+        print(f"session error: {type(error).__name__}: {error}")
+    stats.report(duration)
+    try:
+        samples = await lag
+    except (OSError, asyncio.TimeoutError, ua.UaError) as e:
+        print(f"Tick lag not available: {e}")
+        return
+    if samples:
+        print(f"server tick lag: {1000 * statistics.mean(samples):.1f} ms "
+              f"average, {1000 * max(samples):.1f} ms max")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Open concurrent client sessions against the server and "
+                    "report throughput and latency of their operations."
+    )
+    parser.add_argument("-e", "--endpoint", default="opc.tcp://127.0.0.1:4840")
+    parser.add_argument("--robots-url", default="http://myDobot.factory.com")
+    parser.add_argument("--log-url", default="http://logserver.factory.com")
+    parser.add_argument("-n", "--sessions", type=int, default=10)
+    parser.add_argument(
+        "-d", "--duration", type=float, default=10, help="seconds"
+    )
+    parser.add_argument(
+        "--mix", default=MIX,
+        help=f"weights of operations {', '.join(OPERATIONS)}, default {MIX}"
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=0,
+        help="average seconds a session waits between operations"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=OPERATION_TIMEOUT,
+        help="seconds before an operation fails and the session connects "
+             f"again, default {OPERATION_TIMEOUT}"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    # Notifications of just deleted subscriptions are expected, do not
+    # log them
+    logging.getLogger("asyncua").setLevel(logging.ERROR)
+    asyncio.run(run(parse_args()))
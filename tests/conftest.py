@@ -0,0 +1,92 @@
+import socket
+
+import numpy
+import pytest
+
+from dobot_server.robot_simulation import programs
+
+
+def make_trajectory(path: str, length: int, coordinates=(150, 150, 0, 0),
+                    joints=(0, 40, 40, 0), laser=False, suction_cup=False,
+                    gripper=False) -> programs.Trajectory:
+    """Return a trajectory of ``length`` samples moving along x.
+
+    Default values are within motion and joint limits, effectors are on
+    in every sample they are enabled for.
+    """
+    samples = numpy.arange(length, dtype=numpy.float64)
+    coordinates = numpy.tile(
+        numpy.asarray(coordinates, dtype=numpy.float64), (length, 1)
+    )
+    coordinates[:, 0] += samples / max(length, 1)
+    joints = numpy.tile(
+        numpy.asarray(joints, dtype=numpy.float64), (length, 1)
+    )
+    return programs.Trajectory(
+        path=path,
+        coordinates=coordinates,
+        joints=joints,
+        flags=programs.sample_flags(
+            coordinates, joints, numpy.full(length, laser),
+            numpy.full(length, suction_cup), numpy.full(length, gripper),
+        ),
+    )
+
+
+def write_program(path, length: int, laser=False):
+    """Write a text program file of ``length`` samples."""
+    with open(path, "w") as f:
+        f.write("pose\tangles\tlaser_status\tsuction_cup_status\t"
+                "gripper_status\n")
+        for i in range(length):
+            f.write(
+                f"[{150 + i / 100:.2f}, 150.00, 0.00, 0.00]\t"
+                f"[0.00, 40.00, 40.00, 0.00]\t"
+                f"{'TRUE' if laser else 'FALSE'}\tFALSE\tFALSE\n"
+            )
+    return str(path)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(autouse=True)
+def trajectory_cache():
+    # Programs are cached by path, tests must not see each other's
+    yield
+    programs._trajectories.clear()
+
+
+SERVER = {
+    "server_name": "test", "server_app_uri": "test",
+    "server_address": "127.0.0.1",
+    "server_endpoint": "opc.tcp://127.0.0.1:0",
+    "robots_url": "http://test.factory.com",
+    "log_server_url": "http://logserver.factory.com",
+    "security_policy": [], "country_name": "", "state_or_province_name": "",
+    "locality_name": "", "organization_name": "", "refresh_rate": 1,
+    "capture_file": None,
+}
+
+
+def robot_dict(label: str, program: int = 1, **values) -> dict:
+    return {
+        "label": label, "serial_number": "A1234567890B", "id": 1000,
+        "name": "Souta", "program": program, "version": "1.1.1.0",
+        "laser": False, "suction_cup": False, "gripper": False, **values,
+    }
+
+
+def config_dict(program_paths: list[str], robots: list[dict]) -> dict:
+    """Return a config file content running ``robots``."""
+    return {
+        "server": dict(SERVER),
+        "programs": [
+            {"program": program, "path": path, "time_length": 10}
+            for program, path in enumerate(program_paths, 1)
+        ],
+        "robots": robots,
+    }
@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+from asyncua import Server, ua
+
+from dobot_server import address_space
+
+
+def make_robot(label: str):
+    return SimpleNamespace(
+        label=label, id=1, sn="A1234567890B", name="Souta",
+        version="1.1.1.0", program=1, pose="[1.0, 2.0, 3.0, 4.0]",
+        coordinates=numpy.array([1.0, 2.0, 3.0, 4.0]),
+        joints=numpy.array([5.0, 6.0, 7.0, 8.0]), alarm=0,
+        home="[1.0, 2.0, 3.0, 4.0]", work_status=True, laser=[False],
+        suction_cup=[True, False], gripper=[False],
+    )
+
+
+async def new_server(legacy_names=True):
+    server = Server()
+    await server.init()
+    idx = await server.register_namespace("http://test.factory.com")
+    robot_type = await address_space.add_robot_type(server, idx)
+    added = await address_space.add_robots(
+        server, idx, robot_type.nodeid,
+        [make_robot("robot_1"), make_robot("robot_2")], legacy_names
+    )
+    return server, idx, robot_type, added
+
+
+async def components(node) -> dict:
+    children = await node.get_children(refs=ua.ObjectIds.HasComponent)
+    result = {}
+    for child in children:
+        name = (await child.read_browse_name()).Name
+        result[name] = (child, await child.read_type_definition())
+    return result
+
+
+def test_robots_conform_to_their_type():
+    async def run():
+        server, _, robot_type, added = await new_server()
+        declared = await components(robot_type)
+        robot = added["robot_1"]["node"]
+        children = await components(robot)
+
+        assert await robot.read_type_definition() == robot_type.nodeid
+        assert len(declared) == len(address_space.VARIABLES)
+        for name, (declaration, type_definition) in declared.items():
+            rule = await declaration.get_referenced_nodes(
+                refs=ua.ObjectIds.HasModellingRule
+            )
+            mandatory = ua.NodeId(ua.ObjectIds.ModellingRule_Mandatory)
+            assert rule[0].nodeid == mandatory
+            assert children[name][1] == type_definition
+
+    asyncio.run(run())
+
+
+def test_legacy_names_share_values():
+    async def run():
+        server, _, _, added = await new_server()
+        robot = added["robot_1"]
+        children = await components(robot["node"])
+        alias = children["alarm_robot_1"][0]
+
+        assert alias.nodeid == robot["aliases"]["alarm"].nodeid
+        await server.write_attribute_value(
+            robot["alarm"].nodeid, ua.DataValue(ua.Variant(
+                0x12, ua.VariantType.Int64
+            ))
+        )
+        assert await alias.read_value() == 0x12
+        assert await children["alarm"][0].read_value() == 0x12
+
+        await address_space.remove_robots(server, [robot])
+        assert await components(added["robot_2"]["node"])
+        objects = await server.nodes.objects.get_children()
+        assert robot["node"] not in objects
+        aspace = server.iserver.aspace
+        assert alias.nodeid not in aspace
+        assert robot["alarm"].nodeid not in aspace
+
+    asyncio.run(run())
+
+
+def test_legacy_names_are_optional():
+    async def run():
+        _, _, _, added = await new_server(legacy_names=False)
+        children = await components(added["robot_1"]["node"])
+
+        assert "aliases" not in added["robot_1"]
+        assert set(children) == {
+            name for _, name, _, _ in address_space.VARIABLES
+        }
+
+    asyncio.run(run())
+
+
+def test_robots_keep_their_own_attributes():
+    async def run():
+        server, idx, robot_type, added = await new_server()
+        first, second = added["robot_1"], added["robot_2"]
+        await first["pose"].write_attribute(
+            ua.AttributeIds.Description,
+            ua.DataValue(ua.Variant(ua.LocalizedText("moved")))
+        )
+
+        assert (await second["pose"].read_description()).Text == "pose"
+        assert await first["coordinates"].read_value() == [1, 2, 3, 4]
+        assert await first["coordinates"].read_data_type() \
+            == ua.NodeId(ua.ObjectIds.Double)
+        with pytest.raises(ua.UaError, match="robot_1"):
+            await address_space.add_robots(
+                server, idx, robot_type.nodeid, [make_robot("robot_1")]
+            )
+
+    asyncio.run(run())
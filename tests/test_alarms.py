@@ -0,0 +1,91 @@
+import numpy
+
+from dobot_server.robot_simulation import alarms
+from dobot_server.robot_simulation.fleet import Fleet
+
+from conftest import make_trajectory
+
+
+# Samples out of joint limits, every update may fire an alarm
+OUT_OF_LIMITS = (0, 95, 40, 0)
+DRAWS = 200_000
+
+
+def run_fleet(seed, robots=200, steps=300) -> list:
+    fleet = Fleet(seed=seed)
+    trajectory = make_trajectory("out", 100, joints=OUT_OF_LIMITS)
+    for _ in range(robots):
+        fleet.add(trajectory, 10.0, False, False, False, True, 0.0)
+    history = []
+    for step in range(1, steps + 1):
+        fleet.step(float(step))
+        history.append(fleet.alarm[:fleet.size].copy())
+    return history
+
+
+def assert_mean(samples: numpy.ndarray, expected: float, sigmas=5):
+    error = samples.std() / numpy.sqrt(samples.size)
+    assert abs(samples.mean() - expected) < sigmas * error
+
+
+def test_same_seed_gives_same_alarms():
+    first = run_fleet(seed=7)
+    second = run_fleet(seed=7)
+
+    assert numpy.array_equal(numpy.array(first), numpy.array(second))
+    assert numpy.count_nonzero(first[-1]) > 0
+
+
+def test_other_seed_gives_other_alarms():
+    first = numpy.array(run_fleet(seed=7))
+    second = numpy.array(run_fleet(seed=8))
+
+    assert not numpy.array_equal(first, second)
+
+
+def test_limit_alarms_keep_per_update_probability():
+    # Formerly every update out of limits fired with LIMIT_PROBABILITY
+    rng = numpy.random.default_rng(0)
+    countdowns = alarms.draw_limit_alarms(rng, DRAWS)
+
+    assert countdowns.min() >= 1
+    assert_mean(countdowns, 1 / alarms.LIMIT_PROBABILITY)
+
+
+def test_losing_step_alarms_keep_per_update_probability():
+    # Formerly every update drew four alarms in turn, the first one won
+    draw = 1 / (100 * alarms.PROBABILITY_RANGE)
+    any_alarm = 1 - (1 - draw) ** 4
+    rng = numpy.random.default_rng(0)
+    countdowns, codes = alarms.draw_losing_step_alarms(rng, DRAWS)
+
+    assert numpy.isclose(alarms.LOSING_STEP_PROBABILITY, any_alarm)
+    assert_mean(countdowns, 1 / any_alarm)
+    for code, weight in zip(alarms.LOSING_STEP_ALARMS,
+                            alarms.LOSING_STEP_WEIGHTS):
+        share = numpy.count_nonzero(codes == code) / DRAWS
+        assert abs(share - weight) < 5 * numpy.sqrt(weight / DRAWS)
+
+
+def test_alarm_clears_keep_per_update_probability():
+    rng = numpy.random.default_rng(0)
+    countdowns = alarms.draw_alarm_clears(rng, DRAWS)
+
+    assert_mean(countdowns, 1 / alarms.CLEAR_PROBABILITY)
+
+
+def test_fleet_fires_limit_alarms_at_per_update_probability():
+    fleet = Fleet(seed=3)
+    trajectory = make_trajectory("out", 100, joints=OUT_OF_LIMITS)
+    for _ in range(2000):
+        fleet.add(trajectory, 10.0, False, False, False, True, 0.0)
+    updates = fired = 0
+    for step in range(1, 1001):
+        running = fleet.step(float(step))
+        updates += running.size
+        fired += numpy.count_nonzero(
+            fleet.alarm[running] == alarms.INVERSE_RESOLVE_ALARM
+        )
+
+    expected = updates * alarms.LIMIT_PROBABILITY
+    assert abs(fired - expected) < 5 * numpy.sqrt(expected)
@@ -0,0 +1,103 @@
+import numpy
+import pytest
+
+from dobot_server.robot_simulation import binary, programs
+from dobot_server.robot_simulation.convert import convert
+from dobot_server.robot_simulation.shared import SharedSamples
+
+from conftest import make_trajectory, write_program
+
+
+def test_converted_program_round_trips(tmp_path):
+    source = write_program(tmp_path / "program.txt", 50, laser=True)
+    text = programs.read_trajectory(source)
+
+    target = convert(source, period=0.02)
+    mapped = programs.read_trajectory(target)
+    header = binary.read_header(target)
+
+    assert target == str(tmp_path / "program.trj")
+    assert header["samples"] == 50
+    assert header["period"] == 0.02
+    assert header["effectors"] == {
+        "laser": True, "suction_cup": False, "gripper": False
+    }
+    assert mapped.coordinates.dtype == numpy.float32
+    assert isinstance(mapped.flags, numpy.memmap)
+    assert numpy.allclose(mapped.coordinates, text.coordinates, atol=1e-4)
+    assert numpy.allclose(mapped.joints, text.joints, atol=1e-4)
+    assert numpy.array_equal(mapped.flags, text.flags)
+    assert (mapped.flags & programs.LASER).all()
+    assert programs.format_pose(mapped.coordinates[1], mapped.joints[1]) \
+        == "[150.01, 150.0, 0.0, 0.0, [0.0, 40.0, 40.0, 0.0]]"
+
+
+def test_limit_flags_of_other_limits_are_computed_again(tmp_path):
+    trajectory = make_trajectory("out", 10, joints=(0, 95, 40, 0),
+                                 gripper=True)
+    path = str(tmp_path / "out.trj")
+    binary.write(path, trajectory.coordinates, trajectory.joints,
+                 trajectory.flags & programs.EFFECTORS, limits=0)
+
+    mapped = programs.read_trajectory(path)
+
+    assert numpy.array_equal(mapped.flags, trajectory.flags)
+    assert (mapped.flags & programs.JOINT_LIMITS).all()
+
+
+def test_truncated_and_other_files_are_rejected(tmp_path):
+    trajectory = make_trajectory("a", 10)
+    path = tmp_path / "a.trj"
+    binary.write(str(path), trajectory.coordinates, trajectory.joints,
+                 trajectory.flags, programs.LIMITS_CHECKSUM)
+    path.write_bytes(path.read_bytes()[:-1])
+    text = write_program(tmp_path / "a.txt", 10)
+
+    with pytest.raises(ValueError, match="truncated"):
+        binary.read_header(str(path))
+    with pytest.raises(ValueError, match="not a binary"):
+        binary.read_header(text)
+    assert not binary.is_binary(text)
+
+
+def test_shared_samples_keep_float32_without_copies(tmp_path):
+    text = programs.read_trajectory(write_program(tmp_path / "a.txt", 20))
+    mapped = programs.read_trajectory(
+        convert(write_program(tmp_path / "b.txt", 30, laser=True))
+    )
+    shared = SharedSamples.create([text, mapped])
+    attached = SharedSamples.attach(shared.spec)
+    try:
+        first, second = attached.trajectories()
+
+        assert attached.samples.coordinates.dtype == numpy.float32
+        assert shared.memory.size >= 50 * (4 * 4 * 2 + 1)
+        assert list(attached.offsets.values()) == [0, 20]
+        assert [t.path for t in attached.offsets] == [
+            text.path, mapped.path
+        ]
+        assert numpy.allclose(first.coordinates, text.coordinates)
+        assert numpy.array_equal(second.coordinates, mapped.coordinates)
+        assert numpy.array_equal(second.flags, mapped.flags)
+        assert numpy.shares_memory(second.flags, attached.flags)
+    finally:
+        first = second = None
+        attached.close()
+        shared.close()
+        shared.unlink()
+
+
+def test_shared_trajectories_stay_as_loaded(tmp_path):
+    paths = [
+        convert(write_program(tmp_path / f"{i}.txt", 10 * i, laser=i > 1))
+        for i in (1, 2)
+    ]
+
+    flags, offsets = programs.share_trajectories(paths)
+
+    loaded = [programs.load_trajectory(path) for path in paths]
+    assert all(isinstance(t.coordinates, numpy.memmap) for t in loaded)
+    assert offsets == {loaded[0]: 0, loaded[1]: 10}
+    assert numpy.array_equal(
+        flags, numpy.concatenate([t.flags for t in loaded])
+    )
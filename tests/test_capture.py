@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from asyncua import Client, Server
+
+from dobot_server.capture import InteractionCapture
+
+from conftest import free_port
+
+
+async def capture_session(path, client_session) -> list[dict]:
+    """Run ``client_session`` against a capturing server, return events."""
+    endpoint = f"opc.tcp://127.0.0.1:{free_port()}"
+    server = Server()
+    await server.init()
+    server.set_endpoint(endpoint)
+    log_idx = await server.register_namespace("http://test.log.com")
+    capture = InteractionCapture(server, str(path))
+    await capture.start(log_idx)
+    async with server:
+        async with Client(endpoint) as client:
+            await client_session(client)
+        # Let the server notice the closed connection
+        await asyncio.sleep(0.2)
+    await capture.stop()
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_client_session_is_recorded(tmp_path):
+    async def client_session(client):
+        await client.nodes.objects.get_child(["0:Server", "0:ServerStatus"])
+        await client.nodes.server_state.read_value()
+
+    events = asyncio.run(
+        capture_session(tmp_path / "events.jsonl", client_session)
+    )
+    names = [event["event"] for event in events]
+
+    assert names[:2] == ["session_open", "session_activate"]
+    assert names.count("session_close") == 1
+    assert names[-1] == "session_close"
+    [translate] = [event for event in events if event["event"] == "translate"]
+    assert translate["paths"] == ["0:Server/0:ServerStatus"]
+    assert "error" not in translate
+    assert "read" in names
+    assert len({event["session"] for event in events}) == 1
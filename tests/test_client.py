@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from asyncua import Client
+
+from dobot_server import server
+from honey_client.client import FIELDS, RobotNodes
+
+from conftest import config_dict, free_port, robot_dict, write_program
+
+
+async def read_robots(tmp_path, legacy_names: bool) -> list[dict]:
+    endpoint = f"opc.tcp://127.0.0.1:{free_port()}"
+    data = config_dict(
+        [write_program(tmp_path / "program.txt", 10)],
+        [robot_dict("robot_1"), robot_dict("robot_2", id=1001)],
+    )
+    data["server"].update(
+        server_endpoint=endpoint, legacy_browse_names=legacy_names
+    )
+    config = server.Config.from_dict(data)
+    persona = server.Persona(config)
+    running = asyncio.create_task(persona.run())
+    try:
+        await asyncio.wait_for(persona.ready.wait(), 10)
+        async with Client(endpoint) as client:
+            robots_idx = await client.get_namespace_index(
+                config.server.robots_url
+            )
+            robot_nodes = RobotNodes(client, robots_idx)
+            return await robot_nodes.read(["robot_1", "robot_2"])
+    finally:
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+
+
+@pytest.mark.parametrize("legacy_names", [True, False])
+def test_client_reads_robots_by_type_names(tmp_path, legacy_names):
+    first, second = asyncio.run(read_robots(tmp_path, legacy_names))
+
+    assert set(first) == set(FIELDS)
+    assert (first["id"], second["id"]) == (1000, 1001)
+    assert first["sn"] == "A1234567890B"
+    assert first["pose"].startswith("[150.0")
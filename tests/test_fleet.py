@@ -0,0 +1,158 @@
+import numpy
+
+from dobot_server.robot_simulation import programs
+from dobot_server.robot_simulation.fleet import Fleet
+
+from conftest import make_trajectory
+
+
+START = 1000.0
+
+
+def add(fleet, trajectory, runtime=10.0, laser=False, suction_cup=False,
+        gripper=False, timer=START):
+    return fleet.add(trajectory, runtime, laser, suction_cup, gripper,
+                     True, timer)
+
+
+def test_step_moves_robots_by_elapsed_time():
+    fleet = Fleet(seed=0)
+    slot = add(fleet, make_trajectory("a", 100), runtime=10.0)
+
+    running = fleet.step(START + 2.55)
+
+    assert running.tolist() == [slot]
+    assert fleet.position[slot] == 25
+    assert abs(fleet.runtime[slot] - 2.55) < 1e-6
+
+
+def test_step_wraps_around_the_program():
+    fleet = Fleet(seed=0)
+    slot = add(fleet, make_trajectory("a", 100), runtime=10.0)
+
+    fleet.step(START + 12.55)
+
+    assert fleet.position[slot] == 25
+
+
+def test_step_matches_positions_of_each_robot():
+    # Robots of different programs, lengths and start times step together
+    rng = numpy.random.default_rng(1)
+    fleet = Fleet(seed=0)
+    trajectories = [make_trajectory(f"p{i}", length)
+                    for i, length in enumerate([7, 100, 1234])]
+    robots = []
+    for i in range(50):
+        trajectory = trajectories[i % len(trajectories)]
+        runtime = float(rng.uniform(1, 100))
+        timer = START - float(rng.uniform(0, 1000))
+        robots.append((add(fleet, trajectory, runtime, timer=timer),
+                       trajectory, runtime, timer))
+
+    for now in START + rng.uniform(0, 10000, 20):
+        fleet.step(now)
+        for slot, trajectory, runtime, timer in robots:
+            expected = min(
+                int(((now - timer) % runtime) // (runtime / len(trajectory))),
+                len(trajectory) - 1,
+            )
+            assert fleet.position[slot] == expected
+            assert fleet.offset[slot] + expected < len(fleet.flags)
+
+
+def test_step_leaves_stopped_robots_and_other_slots():
+    fleet = Fleet(seed=0)
+    trajectory = make_trajectory("a", 100)
+    stopped = add(fleet, trajectory)
+    outside = add(fleet, trajectory)
+    stepped = add(fleet, trajectory)
+    fleet.work_status[stopped] = False
+
+    running = fleet.step(START + 5.05, numpy.array([stopped, stepped]))
+
+    assert running.tolist() == [stepped]
+    assert fleet.position[stepped] == 50
+    assert fleet.position[stopped] == 0
+    assert fleet.position[outside] == 0
+
+
+def test_step_keeps_disabled_effectors_off():
+    fleet = Fleet(seed=0)
+    trajectory = make_trajectory("a", 10, laser=True, gripper=True)
+    enabled = add(fleet, trajectory, laser=True, suction_cup=True,
+                  gripper=True)
+    disabled = add(fleet, trajectory)
+
+    fleet.step(START + 1)
+
+    assert fleet.laser_status[enabled]
+    assert not fleet.suction_cup_status[enabled]
+    assert fleet.gripper_status[enabled]
+    assert not fleet.laser_status[disabled]
+    assert not fleet.gripper_status[disabled]
+
+
+def test_robots_share_samples_of_their_program():
+    fleet = Fleet(seed=0)
+    first = make_trajectory("a", 10)
+    second = make_trajectory("b", 20)
+    slots = [add(fleet, first), add(fleet, second), add(fleet, first)]
+
+    assert len(fleet.flags) == 30
+    assert fleet.offset[slots].tolist() == [0, 10, 0]
+
+
+def test_changed_program_gets_its_own_samples():
+    # A program removed, edited and loaded again under the same path
+    fleet = Fleet(seed=0)
+    other = add(fleet, make_trajectory("b", 20))
+    old = add(fleet, make_trajectory("a", 10))
+    fleet.remove(old)
+    changed = add(fleet, make_trajectory("a", 30))
+
+    fleet.step(START + 9.95)
+
+    assert fleet.position[changed] == 29
+    assert fleet.offset[[other, changed]].tolist() == [0, 20]
+    assert len(fleet.flags) == 50
+
+
+def test_removed_programs_free_their_samples():
+    fleet = Fleet(seed=0)
+    first = make_trajectory("a", 10, laser=True)
+    second = make_trajectory("b", 20)
+    slots = [add(fleet, first), add(fleet, first), add(fleet, second)]
+
+    fleet.remove(slots[0])
+    assert len(fleet.flags) == 30
+    fleet.remove(slots[1])
+
+    assert len(fleet.flags) == 20
+    assert fleet.offset[slots[2]] == 0
+    assert not (fleet.flags & programs.LASER).any()
+
+
+def test_shared_flags_are_kept():
+    fleet = Fleet(seed=0)
+    shared = make_trajectory("a", 10)
+    fleet.use_flags(shared.flags, {shared: 0})
+    slot = add(fleet, shared)
+    own = add(fleet, make_trajectory("b", 20))
+
+    fleet.remove(slot)
+    fleet.remove(own)
+
+    assert fleet.flags is shared.flags
+    assert fleet.offset[add(fleet, shared)] == 0
+
+
+def test_removed_robots_stay_stopped():
+    fleet = Fleet(seed=0)
+    slot = add(fleet, make_trajectory("a", 10))
+    fleet.alarm[slot] = 0x12
+    fleet.remove(slot)
+
+    running = fleet.step(START + 10_000)
+
+    assert running.size == 0
+    assert not fleet.work_status[slot]
@@ -0,0 +1,21 @@
+import logging
+import queue
+
+from dobot_server import logs
+from dobot_server.metrics import Metrics
+
+
+def test_dropped_log_records_are_counted():
+    root = logging.getLogger()
+    handler = logs.DroppingQueueHandler(queue.Queue(1))
+    metrics = Metrics()
+    root.addHandler(handler)
+    try:
+        for i in range(3):
+            root.warning(f"record {i}")
+        metrics.sample()
+    finally:
+        root.removeHandler(handler)
+
+    assert metrics.counters["log_records_dropped"] == 2
+    assert "dobot_log_records_dropped_total 2\n" in metrics.prometheus()
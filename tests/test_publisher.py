@@ -0,0 +1,37 @@
+import time
+from types import SimpleNamespace
+
+from asyncua import ua
+
+from dobot_server.publisher import VALUES, Publisher
+from dobot_server.robot_simulation.fleet import Fleet
+from dobot_server.robot_simulation.robot import Robot
+
+from conftest import write_program
+
+
+def test_changed_values_carry_one_timestamp(tmp_path):
+    fleet = Fleet(seed=0)
+    robot = Robot(
+        "robot_1", 1, "sn", "1.1.1.0", 1, "name", False, False, False,
+        write_program(tmp_path / "program.txt", 100), 10, fleet=fleet,
+    )
+    nodes = {
+        name: SimpleNamespace(nodeid=ua.NodeId(name, 2)) for name in VALUES
+    }
+    publisher = Publisher(fleet)
+    publisher.add(robot, nodes)
+
+    fleet.step(time.time() + 5)
+    values = publisher.changes()
+
+    assert {value.NodeId for value in values} == {
+        nodes[name].nodeid for name in ("pose", "coordinates", "joints")
+    }
+    timestamps = {value.Value.SourceTimestamp for value in values}
+    assert len(timestamps) == 1 and None not in timestamps
+    assert all(
+        value.Value.ServerTimestamp == value.Value.SourceTimestamp
+        for value in values
+    )
+    assert publisher.changes() == []
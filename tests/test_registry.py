@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from dobot_server import server
+from dobot_server.registry import RobotRegistry
+
+from conftest import config_dict, robot_dict, write_program
+
+
+def make_registry() -> RobotRegistry:
+    registry = RobotRegistry()
+    for i in range(1, 7):
+        robot = SimpleNamespace(
+            label=f"robot_{i}", id=1000 + i % 3, program=1 + i % 2
+        )
+        registry.add(robot, [f"line_{i % 2}"] + (["spare"] if i > 5 else []))
+    return registry
+
+
+def labels(robots) -> list[str]:
+    return [robot.label for robot in robots]
+
+
+@pytest.mark.parametrize("selectors, expected", [
+    ("robot_2", ["robot_2"]),
+    ("robot_2, robot_4 robot_2", ["robot_2", "robot_4"]),
+    ("robot_[12]", ["robot_1", "robot_2"]),
+    ("robot_?", [f"robot_{i}" for i in range(1, 7)]),
+    ("*", [f"robot_{i}" for i in range(1, 7)]),
+    ("id:1000", ["robot_3", "robot_6"]),
+    ("program:1", ["robot_2", "robot_4", "robot_6"]),
+    ("group:line_1", ["robot_1", "robot_3", "robot_5"]),
+    ("group:spare,robot_1", ["robot_6", "robot_1"]),
+    ("robot_9", []),
+    ("group:none id:5", []),
+    ("", []),
+])
+def test_select(selectors, expected):
+    assert labels(make_registry().select(selectors)) == expected
+
+
+def test_labels_must_be_unique():
+    registry = make_registry()
+
+    with pytest.raises(ValueError):
+        registry.add(SimpleNamespace(label="robot_1", id=1, program=1))
+
+
+def test_remove_updates_indexes():
+    registry = make_registry()
+
+    removed = registry.remove(["robot_2", "robot_6"])
+
+    assert labels(removed) == ["robot_2", "robot_6"]
+    assert len(registry) == 4
+    assert labels(registry.select("program:1")) == ["robot_4"]
+    assert registry.select("group:spare") == []
+    assert registry.get("robot_2") is None
+
+
+@pytest.fixture
+def persona(tmp_path):
+    path = write_program(tmp_path / "program.txt", 10)
+    config = server.Config.from_dict(config_dict(
+        [path], [robot_dict("robot_1"), robot_dict("robot_2")]
+    ))
+    persona = server.Persona(config)
+    persona.create_robots(config.robots, config.programs)
+    return persona
+
+
+@pytest.mark.parametrize("value, answer", [
+    ("robot_9", "Something went wrong"),
+    ("", "Something went wrong"),
+    ("robot_1, robot_2", "Only one object at a time"),
+    ("robot_1,", "Only one object at a time"),
+    ("robot_*", "Only one object at a time"),
+])
+def test_realtime_pose_answers_of_original_server(persona, value, answer):
+    assert asyncio.run(persona.get_realtime_pose(None, value)) == answer
+
+
+def test_realtime_pose(persona):
+    pose = asyncio.run(persona.get_realtime_pose(None, "robot_1"))
+
+    assert pose == persona.registry.get("robot_1").pose
+    assert pose.startswith("[15")
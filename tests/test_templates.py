@@ -0,0 +1,126 @@
+import pytest
+import yaml
+
+from dobot_server import server, templates
+
+from conftest import SERVER, config_dict, robot_dict
+
+
+TEMPLATE = {
+    "count": 3, "label": "cell_{n}", "serial_number": "A{n:010d}B",
+    "name": "Arm {index}", "id": 2000, "program": 1, "version": "1.1.1.0",
+    "laser": True, "suction_cup": False, "gripper": False,
+    "groups": ["line_{n}", "cells"],
+}
+
+
+def test_template_generates_numbered_robots():
+    robots = list(templates.expand_template(TEMPLATE))
+
+    assert [r["label"] for r in robots] == ["cell_1", "cell_2", "cell_3"]
+    assert robots[0]["serial_number"] == "A0000000001B"
+    assert [r["name"] for r in robots] == ["Arm 0", "Arm 1", "Arm 2"]
+    assert [r["id"] for r in robots] == [2000, 2001, 2002]
+    assert robots[2]["groups"] == ["line_3", "cells"]
+    assert all("count" not in r for r in robots)
+
+
+def test_template_start_and_id_pattern():
+    template = dict(TEMPLATE, start=10, id="5{n:03d}")
+
+    robots = list(templates.expand_template(template))
+
+    assert robots[0]["label"] == "cell_10"
+    assert [r["id"] for r in robots] == [5010, 5011, 5012]
+
+
+@pytest.mark.parametrize("program, expected", [
+    (2, [2, 2, 2, 2]),
+    ([1, 2, 3], [1, 2, 3, 1]),
+    ({1: 3, 2: 1}, [1, 1, 2, 1]),
+])
+def test_programs_are_assigned(program, expected):
+    assert list(templates.assign_programs(program, 4)) == expected
+
+
+def test_weighted_programs_keep_their_shares():
+    assigned = list(templates.assign_programs({1: 3, 2: 1}, 1000))
+
+    assert assigned.count(1) == 750
+    assert assigned == list(templates.assign_programs({1: 3, 2: 1}, 1000))
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"count": -1}, "non-negative count"),
+    ({"start": "1"}, "integer start"),
+    ({"program": []}, "no programs"),
+    ({"program": {1: 0}}, "positive program weights"),
+    ({"label": "cell_{m}"}, "invalid pattern"),
+    ({"id": "x{n}"}, "does not give a number"),
+])
+def test_invalid_templates_are_rejected(change, message):
+    with pytest.raises(ValueError, match=message):
+        list(templates.expand_template(dict(TEMPLATE, **change), 4))
+
+
+def test_robots_mix_templates_and_plain_robots():
+    robots = list(templates.expand_robots([robot_dict("robot_1"), TEMPLATE]))
+
+    assert [r["label"] for r in robots] == [
+        "robot_1", "cell_1", "cell_2", "cell_3"
+    ]
+    with pytest.raises(ValueError, match="Robot 1 is not a mapping"):
+        list(templates.expand_robots([robot_dict("robot_1"), "robot_2"]))
+
+
+def test_config_expands_templates():
+    data = config_dict(["a.txt", "b.txt"], [
+        robot_dict("robot_1"), dict(TEMPLATE, program=[1, 2]),
+    ])
+
+    config = server.Config.from_dict(data)
+
+    assert [r.label for r in config.robots] == [
+        "robot_1", "cell_1", "cell_2", "cell_3"
+    ]
+    assert [r.program for r in config.robots] == [1, 1, 2, 1]
+    assert config.robots[2].groups == ["line_2", "cells"]
+    assert config.program_paths() == ["a.txt", "b.txt"]
+
+
+@pytest.mark.parametrize("paths, robots, message", [
+    (["a.txt"], [robot_dict("robot_1", program=2)], "unknown program 2"),
+    (["a.txt"], [robot_dict("robot_1"), robot_dict("robot_1")],
+     "robot_1 is not unique"),
+    (["a.txt"], [robot_dict("cell_2"), TEMPLATE], "cell_2 is not unique"),
+    (["a.txt"], [robot_dict("robot_1", colour="red")], "'robot_1'"),
+])
+def test_config_validate_rejects(paths, robots, message):
+    with pytest.raises(ValueError, match=message):
+        server.Config.from_dict(config_dict(paths, robots))
+
+
+def test_config_validate_rejects_repeated_programs():
+    data = config_dict(["a.txt", "b.txt"], [robot_dict("robot_1")])
+    data["programs"][1]["program"] = 1
+
+    with pytest.raises(ValueError, match="not unique"):
+        server.Config.from_dict(data)
+
+
+def test_servers_share_programs(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump({
+        "programs": config_dict(["a.txt"], [])["programs"],
+        "servers": [
+            {"server": dict(SERVER), "robots": [TEMPLATE]},
+            {"server": dict(SERVER), "robots": [robot_dict("robot_1")]},
+        ],
+    }))
+
+    first, second = server.load_configs(str(path))
+
+    assert len(first.robots) == 3
+    assert first.programs == second.programs
+    assert second.server.certificate_name == "server_1"
+    assert second.server.capture_file is None